@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
-from . import models
+from . import models, services
 
 
 class CarAdmin(admin.ModelAdmin):
@@ -20,8 +20,24 @@ class OrderEntryInline(admin.TabularInline):
 
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('date', 'order_sum', 'status', 'due_back')
+    # kept by the entries, Order.save() never writes it
+    readonly_fields = ('order_sum',)
     inlines = [OrderEntryInline]
 
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not models.OrderEntry:
+            return super().save_formset(request, form, formset, change)
+        entries = formset.save(commit=False)
+        for entry in formset.deleted_objects:
+            entry.delete()
+        for entry, changed_fields in formset.changed_objects:
+            entry.save()
+        # new rows go in with one price lookup and one order_sum update
+        formset.new_objects = services.add_entries(form.instance, [
+            (entry.service_id, entry.quantity, entry.price)
+            for entry in entries if entry.pk is None
+        ])
+
 
 class ServiceAdmin(admin.ModelAdmin):
     list_display = ('name', 'price')
@@ -35,6 +51,12 @@ class OrderCommentAdmin(admin.ModelAdmin):
     list_display = ('created_at', 'order', 'commenter', 'content')
 
 
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('key', 'to', 'subject', 'attempts', 'send_after', 'sent_at')
+    list_filter = ('sent_at',)
+    search_fields = ('key', 'to')
+
+
 admin.site.register(models.CarModel, CarModelAdmin)
 admin.site.register(models.Car, CarAdmin)
 admin.site.register(models.Order, OrderAdmin)
@@ -43,3 +65,4 @@ admin.site.register(models.OrderEntry, OrderEntryAdmin)
 admin.site.register(models.OrderComment, OrderCommentAdmin)
 
 # Register your models here.
+admin.site.register(models.OutboxEmail, OutboxEmailAdmin)
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class AutoservisasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'autoservisas'
+
+    def ready(self):
+        from . import signals
+        from . db import tune_sqlite
+        connection_created.connect(tune_sqlite, dispatch_uid='autoservisas_tune_sqlite')
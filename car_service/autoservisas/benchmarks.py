@@ -0,0 +1,224 @@
+import json
+import os
+import platform
+import socket
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from statistics import mean, median
+from time import perf_counter, sleep
+from urllib.request import urlopen
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from . models import Car, Order
+
+User = get_user_model()
+
+
+def scenarios() -> list[tuple[str, str, bool]]:
+    """``(name, path, needs login)`` of the pages worth watching, picked from the current data."""
+    car = Car.objects.order_by('pk').first()
+    order = Order.objects.order_by('-order_sum').first()
+    busiest = Order.objects.order_by().values('pk').annotate(
+        comment_count=Count('comments'),
+    ).order_by('-comment_count').first()
+    result = [
+        ('index', reverse('index'), False),
+        ('car_list', reverse('car_list'), False),
+        ('car_list_search', reverse('car_list') + '?query=audi', False),
+        ('order_list', reverse('order_list'), False),
+        ('order_list_search', reverse('order_list') + '?query=jonas', False),
+        ('user_orders', reverse('user_orders'), True),
+        ('user_car_list', reverse('user_car_list'), True),
+    ]
+    if car:
+        result.append(('car_detail', reverse('car_detail', kwargs={'pk': car.pk}), False))
+    if order:
+        result.append(('order_details', reverse('order_details', kwargs={'pk': order.pk}), False))
+    if busiest:
+        result.append(('order_details_comments', reverse('order_details', kwargs={'pk': busiest['pk']}), False))
+    return result
+
+
+def run(repeat: int = 10, warmup: int = 1, host: str = 'localhost') -> dict:
+    """Request every scenario ``repeat`` times, returns a JSON-ready report."""
+    client = Client(SERVER_NAME=host)
+    anonymous = Client(SERVER_NAME=host)
+    customer = User.objects.filter(orders__isnull=False).order_by('pk').first()
+    if customer:
+        client.force_login(customer)
+    results = {}
+    for name, path, needs_login in scenarios():
+        browser = client if needs_login else anonymous
+        if needs_login and not customer:
+            continue
+        for _ in range(warmup):
+            browser.get(path)
+        timings, query_counts = [], []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = perf_counter()
+                response = browser.get(path)
+                timings.append((perf_counter() - started) * 1000)
+            query_counts.append(len(queries))
+        timings.sort()
+        results[name] = {
+            'path': path,
+            'status': response.status_code,
+            'queries': max(query_counts),
+            'mean_ms': round(mean(timings), 3),
+            'p50_ms': round(median(timings), 3),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            'bytes': len(response.content),
+        }
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'rows': {
+            'users': User.objects.count(),
+            'cars': Car.objects.count(),
+            'orders': Order.objects.count(),
+        },
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(previous: dict, current: dict, threshold: float) -> list[str]:
+    """Scenarios slower by more than ``threshold`` percent or running more queries than before."""
+    regressions = []
+    for name, result in current['results'].items():
+        before = previous.get('results', {}).get(name)
+        if not before:
+            continue
+        if result['queries'] > before['queries']:
+            regressions.append(f"{name}: {before['queries']} -> {result['queries']} queries")
+        if result['p50_ms'] > before['p50_ms'] * (1 + threshold / 100):
+            regressions.append(f"{name}: p50 {before['p50_ms']} -> {result['p50_ms']} ms")
+    return regressions
+
+
+def load(path: str) -> dict:
+    with open(path) as report_file:
+        return json.load(report_file)
+
+
+def list_querysets() -> dict:
+    """``name: (full rows, list projection)`` of the list views, same joins on both sides."""
+    return {
+        'car_list': (Car.objects.select_related('car_model'), Car.objects.for_list()),
+        'order_list': (Order.objects.select_related('car__car_model', 'car__customer'), Order.objects.for_list()),
+    }
+
+
+def projection_cost(qs) -> dict:
+    """Columns and bytes ``qs`` reads from the database and the memory its model instances take."""
+    sql, params = qs.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = len(cursor.description)
+        transferred = sum(len(str(value)) for row in cursor.fetchall() for value in row if value is not None)
+    tracemalloc.start()
+    started = perf_counter()
+    objects = list(qs.all())
+    elapsed = perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'rows': len(objects),
+        'columns': columns,
+        'bytes': transferred,
+        'peak_kb': round(memory / 1024, 1),
+        'ms': round(elapsed * 1000, 3),
+    }
+
+
+def compare_projections(page_size: int = 500) -> dict:
+    """Cost of one ``page_size`` page of each list view, full rows against the list projection."""
+    return {
+        name: {
+            'full': projection_cost(full.order_by('pk')[:page_size]),
+            'list': projection_cost(slim.order_by('pk')[:page_size]),
+        } for name, (full, slim) in list_querysets().items()
+    }
+
+
+# pages with an async variant, see settings.ASYNC_VIEWS
+ASYNC_SCENARIOS = ('index', 'car_list', 'car_list_search', 'order_list', 'car_detail')
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+@contextmanager
+def serving(command: list[str], port: int, env: dict | None = None, timeout: float = 30):
+    """Run the server ``command`` until the block ends, waiting for ``port`` to accept connections first."""
+    server = subprocess.Popen(
+        command, env={**os.environ, **(env or {})}, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        deadline = perf_counter() + timeout
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"{' '.join(command)} exited: {server.stderr.read().decode()[-2000:]}")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if perf_counter() > deadline:
+                    raise RuntimeError(f"{' '.join(command)} is not listening on port {port}")
+                sleep(0.1)
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+        server.stderr.close()
+
+
+def fetch(url: str) -> float:
+    started = perf_counter()
+    with urlopen(url, timeout=30) as response:
+        response.read()
+    return (perf_counter() - started) * 1000
+
+
+def load_test(base_url: str, path: str, requests: int, concurrency: int) -> dict:
+    """``requests`` GETs of ``path`` with ``concurrency`` of them in flight at a time, after one warm-up GET."""
+    fetch(base_url + path)
+    with ThreadPoolExecutor(concurrency) as pool:
+        started = perf_counter()
+        timings = sorted(pool.map(fetch, [base_url + path] * requests))
+        elapsed = perf_counter() - started
+    return {
+        'requests_per_second': round(requests / elapsed, 1),
+        'p50_ms': round(median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+    }
+
+
+def compare_servers(servers: dict, requests: int = 200, concurrency: int = 20) -> dict:
+    """Throughput of the async pages on each server.
+
+    ``servers`` maps a name to ``(command, port, extra environment)``, every
+    server is started on its own and stopped before the next one.
+    """
+    paths = {name: path for name, path, needs_login in scenarios() if name in ASYNC_SCENARIOS}
+    results = {}
+    for server, (command, port, env) in servers.items():
+        with serving(command, port, env) as base_url:
+            results[server] = {name: load_test(base_url, path, requests, concurrency) for name, path in paths.items()}
+    return results
@@ -0,0 +1,118 @@
+"""Conditional GET for the detail pages the shop floor tablets keep polling.
+
+Last-Modified is the newest ``updated_at`` among the rows a page shows. The
+ETag adds the viewing user, whose name and comment form are on the page too.
+Responses carry ``Cache-Control: private, no-cache``: browsers revalidate on
+every poll and get a 304 while nothing changed, and a shared proxy passes the
+revalidation through instead of handing one user's copy to another.
+
+Accepted staleness: catalogue and account edits, a renamed ``CarModel`` or
+``Service``, a customer's or commenter's name or profile picture, leave the
+timestamps alone. Pages showing them revalidate to the old copy until the
+order, car, an entry or a comment changes next.
+"""
+from calendar import timegm
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.db.models import Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from . models import Car, Order, OrderComment, OrderEntry
+
+
+def memoized(changed):
+    """Run ``changed`` once per request, condition() asks for the ETag and Last-Modified separately."""
+    def wrapper(request, pk, **kwargs):
+        memo = request.__dict__.setdefault('_last_changes', {})
+        key = (changed.__name__, pk)
+        if key not in memo:
+            memo[key] = changed(request, pk)
+        return memo[key]
+    return wrapper
+
+
+@memoized
+def car_changed(request, pk):
+    return Car.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+
+
+async def acar_changed(request, pk):
+    return await Car.objects.filter(pk=pk).values_list('updated_at', flat=True).afirst()
+
+
+def latest(model) -> Subquery:
+    return Subquery(
+        model.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        .annotate(latest=Max('updated_at')).values('latest')
+    )
+
+
+@memoized
+def order_changed(request, pk):
+    """Newest change of the order, its car, entries and comments, in one query."""
+    row = Order.objects.filter(pk=pk).order_by().values('updated_at', 'car__updated_at').annotate(
+        entries_updated_at=latest(OrderEntry),
+        comments_updated_at=latest(OrderComment),
+    ).first()
+    if row is None:
+        return None
+    return max(changed for changed in row.values() if changed)
+
+
+def make_etag(pk, last_change, user_pk) -> str:
+    return f'"{pk}-{last_change.timestamp()}-{user_pk or 0}"'
+
+
+def user_etag(changed):
+    def etag(request, pk, **kwargs):
+        last_change = changed(request, pk)
+        if last_change is None:
+            return None
+        return make_etag(pk, last_change, request.user.pk)
+    return etag
+
+
+def conditional(changed):
+    """View decorator answering conditional GETs from ``changed(request, pk)``."""
+    def decorator(view):
+        view = condition(etag_func=user_etag(changed), last_modified_func=changed)(view)
+        return cache_control(private=True, no_cache=True)(view)
+    return decorator
+
+
+def conditional_view(changed):
+    """``conditional`` for class based views."""
+    return method_decorator(conditional(changed), name='dispatch')
+
+
+def aconditional(changed):
+    """``conditional`` for async views, ``changed(request, pk)`` is awaited once.
+
+    Mirrors what ``condition()`` and ``cache_control()`` do, they only wrap
+    sync views before Django 5.0.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, pk, **kwargs):
+            last_change = await changed(request, pk)
+            etag = last_modified = None
+            if last_change is not None:
+                # request.user loads the session and the user, not allowed on the event loop
+                user_pk = await sync_to_async(lambda: request.user.pk)()
+                etag = make_etag(pk, last_change, user_pk)
+                last_modified = timegm(last_change.utctimetuple())
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, pk, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,68 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# dashboard counter name -> counted model
+COUNTERS = {
+    'services_count': 'autoservisas.Service',
+    'services_done': 'autoservisas.OrderEntry',
+    'count_cars': 'autoservisas.Car',
+}
+
+
+def counter_key(name: str) -> str:
+    return f'autoservisas:counter:{name}'
+
+
+def get_counters() -> dict[str, int]:
+    """Return all dashboard counters, counting only the ones missing from the cache."""
+    keys = {counter_key(name): name for name in COUNTERS}
+    cached = cache.get_many(keys)
+    counters = {keys[key]: value for key, value in cached.items()}
+    missing = {}
+    for key, name in keys.items():
+        if name not in counters:
+            counters[name] = missing[key] = apps.get_model(COUNTERS[name]).objects.count()
+    if missing:
+        cache.set_many(missing, settings.DASHBOARD_COUNTERS_TIMEOUT)
+    return counters
+
+
+async def aget_counters() -> dict[str, int]:
+    """``get_counters()`` for async views."""
+    keys = {counter_key(name): name for name in COUNTERS}
+    cached = await cache.aget_many(keys)
+    counters = {keys[key]: value for key, value in cached.items()}
+    missing = {}
+    for key, name in keys.items():
+        if name not in counters:
+            counters[name] = missing[key] = await apps.get_model(COUNTERS[name]).objects.acount()
+    if missing:
+        await cache.aset_many(missing, settings.DASHBOARD_COUNTERS_TIMEOUT)
+    return counters
+
+
+def adjust(model, delta: int) -> None:
+    """Shift the counters of ``model`` by ``delta`` once the current transaction commits."""
+    label = model._meta.label
+    keys = [counter_key(name) for name, counted in COUNTERS.items() if counted == label]
+    if keys and delta:
+        transaction.on_commit(lambda: _incr(keys, delta))
+
+
+def invalidate(model) -> None:
+    label = model._meta.label
+    cache.delete_many([counter_key(name) for name, counted in COUNTERS.items() if counted == label])
+
+
+def _incr(keys, delta):
+    for key in keys:
+        try:
+            if delta > 0:
+                cache.incr(key, delta)
+            else:
+                cache.decr(key, -delta)
+        except ValueError:
+            # not cached, the next get_counters() counts it afresh
+            pass
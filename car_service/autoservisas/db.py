@@ -0,0 +1,14 @@
+from django.conf import settings
+
+
+def tune_sqlite(sender, connection, **kwargs):
+    """Apply ``SQLITE_PRAGMAS`` to a new SQLite connection.
+
+    WAL lets readers carry on while one writer commits, and with
+    ``synchronous=NORMAL`` a commit no longer waits for an fsync.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
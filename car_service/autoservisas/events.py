@@ -0,0 +1,173 @@
+"""Order status events for the live workshop board.
+
+Order.save() publishes a message once the transaction commits. The broker
+named by ``ORDER_EVENTS_BROKER`` fans it out to every open
+``/orders/events/`` stream. A stream waits on an in-memory queue and runs
+no queries of its own.
+
+``LocalBroker`` only reaches streams in the process that saved the order.
+When orders are saved in other processes too (several ASGI workers, a WSGI
+admin), use ``PollingBroker``. Status changes are then written as
+``OrderStatusEvent`` rows along with the order, and each process reads the
+new rows once per ``ORDER_EVENTS_POLL_SECONDS``, however many displays watch.
+"""
+import asyncio
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from . models import Order, OrderStatusEvent
+
+QUEUE_SIZE = 100
+# events older than this are deleted, only streams open right now read them
+EVENT_RETENTION = timedelta(hours=1)
+# how long a skipped event id is looked for before it is taken for a rolled back transaction
+GAP_SECONDS = 60
+# sequences may jump far (cached values, many rollbacks), waiting is only worth it for nearby ids
+MAX_GAP = 1000
+_brokers = {}
+
+
+def status_message(order_id: int, status: int, plate_number: str) -> dict:
+    return {
+        'id': order_id,
+        'status': status,
+        'label': str(dict(Order.STATUS_CHOICES).get(status, status)),
+        'plate_number': plate_number,
+    }
+
+
+class Subscription:
+    """``async with`` block receiving the broker's messages on the queue it returns.
+
+    A class rather than an async generator: streams left to the garbage
+    collector are finalized in no particular order, and a generator based
+    context manager closed before its stream raises on exit.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.subscriber = None
+
+    async def __aenter__(self) -> asyncio.Queue:
+        self.subscriber = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE))
+        with self.broker.lock:
+            self.broker.subscribers.add(self.subscriber)
+        try:
+            await self.broker.subscribed()
+        except BaseException:
+            self.discard()
+            raise
+        return self.subscriber[1]
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.discard()
+
+    def discard(self) -> None:
+        with self.broker.lock:
+            self.broker.subscribers.discard(self.subscriber)
+
+
+class LocalBroker:
+    """Fans messages out to the subscribers of this process."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def record(self, order: Order) -> None:
+        """Publish the status of ``order`` once the current transaction commits."""
+        message = status_message(order.pk, order.status, order.car.plate_number)
+        transaction.on_commit(lambda: self.publish(message))
+
+    def publish(self, message: dict) -> None:
+        """Deliver ``message`` to every subscriber, callable from any thread."""
+        self.deliver(message)
+
+    def deliver(self, message: dict) -> None:
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self.offer, queue, message)
+            except RuntimeError:
+                # the subscriber's loop is closed, its stream is gone
+                pass
+
+    @staticmethod
+    def offer(queue: asyncio.Queue, message: dict) -> None:
+        if queue.full():
+            # a display that cannot keep up loses its oldest events, not the newest
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    def subscribe(self) -> Subscription:
+        """Queue receiving the published messages while the context is open."""
+        return Subscription(self)
+
+    async def subscribed(self) -> None:
+        pass
+
+
+class PollingBroker(LocalBroker):
+    """Finds status changes of every process in the database, one poll per process."""
+
+    def __init__(self):
+        super().__init__()
+        self.poller = None
+
+    def record(self, order: Order) -> None:
+        # commits or rolls back with the change, the poll of every process finds it
+        OrderStatusEvent.objects.create(order=order, status=order.status)
+
+    async def subscribed(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.poller is None or self.poller.done() or self.poller.get_loop() is not loop:
+            self.poller = loop.create_task(self.poll())
+
+    async def poll(self) -> None:
+        """Deliver new events in id order.
+
+        Ids are handed out when a row is inserted, not when it commits, so an
+        id skipped over may still turn up. Such gaps are looked for again in
+        the following polls, for ``GAP_SECONDS``.
+        """
+        loop = asyncio.get_running_loop()
+        last_id = (await OrderStatusEvent.objects.aaggregate(last_id=Max('pk')))['last_id'] or 0
+        gaps = {}
+        pruned_at = None
+        while self.subscribers:
+            await asyncio.sleep(settings.ORDER_EVENTS_POLL_SECONDS)
+            if pruned_at is None or loop.time() - pruned_at > EVENT_RETENTION.total_seconds():
+                await OrderStatusEvent.objects.filter(created_at__lt=timezone.now() - EVENT_RETENTION).adelete()
+                pruned_at = loop.time()
+            new_events = OrderStatusEvent.objects.filter(Q(pk__gt=last_id) | Q(pk__in=list(gaps))).order_by('pk').values_list(
+                'pk', 'order_id', 'status', 'order__car__plate_number',
+            )
+            async for event_id, order_id, status, plate_number in new_events:
+                if event_id > last_id:
+                    gaps.update(dict.fromkeys(range(max(last_id + 1, event_id - MAX_GAP), event_id), loop.time()))
+                    last_id = event_id
+                gaps.pop(event_id, None)
+                self.deliver(status_message(order_id, status, plate_number))
+            gaps = {event_id: seen for event_id, seen in gaps.items() if loop.time() - seen < GAP_SECONDS}
+
+
+def get_broker() -> LocalBroker:
+    path = settings.ORDER_EVENTS_BROKER
+    if path not in _brokers:
+        _brokers[path] = import_string(path)()
+    return _brokers[path]
+
+
+def publish_status(order: Order) -> None:
+    """Publish the status of ``order`` once the current transaction commits."""
+    get_broker().record(order)
+
+
+def subscribe():
+    """``async with subscribe() as queue`` on the configured broker."""
+    return get_broker().subscribe()
@@ -0,0 +1,104 @@
+import csv
+import os
+import tempfile
+from django.utils.translation import gettext_lazy as _
+from . models import OrderEntry
+from . search import parse_dates
+
+CHUNK_SIZE = 2000
+
+# a spreadsheet reads a cell starting with these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+COLUMNS = [
+    ('order_id', _('order')),
+    ('order__date', _('date')),
+    ('order__status', _('status')),
+    ('order__customer__username', _('customer')),
+    ('order__car__plate_number', _('plate number')),
+    ('service__name', _('service')),
+    ('quantity', _('quantity')),
+    ('price', _('price')),
+    ('total', _('total')),
+    ('order__order_sum', _('order sum')),
+]
+
+
+class ExportError(ValueError):
+    pass
+
+
+def entries(period: str | None = None, statuses=None):
+    """Order entries of ``period`` (anything search.parse_dates takes) and ``statuses``, in export columns."""
+    qs = OrderEntry.objects.all()
+    if period:
+        dates = parse_dates(period)
+        if not dates:
+            raise ExportError(f'Cannot read period {period!r}, use e.g. 2023-06 or 2023-01..2023-03.')
+        qs = qs.filter(order__date__gte=dates[0], order__date__lt=dates[1])
+    if statuses:
+        qs = qs.filter(order__status__in=statuses)
+    return qs.order_by('order__date', 'order_id', 'pk').values_list(*[name for name, label in COLUMNS])
+
+
+def rows(period: str | None = None, statuses=None):
+    """Header and data rows, read from the database ``CHUNK_SIZE`` rows at a time."""
+    yield [str(label) for name, label in COLUMNS]
+    yield from entries(period, statuses).iterator(chunk_size=CHUNK_SIZE)
+
+
+class Echo:
+    """File-like object handing back what is written, so csv.writer feeds a streaming response."""
+
+    def write(self, value):
+        return value
+
+
+def csv_cell(value):
+    """``value`` with text that would start a formula quoted, plates and names are typed in by users."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(period: str | None = None, statuses=None):
+    writer = csv.writer(Echo())
+    for row in rows(period, statuses):
+        yield writer.writerow([csv_cell(value) for value in row])
+
+
+def write_xlsx(path, period: str | None = None, statuses=None) -> None:
+    """Write the export to an XLSX file at ``path`` with xlsxwriter's constant memory mode.
+
+    xlsxwriter is optional, ExportError tells when it is not installed.
+    """
+    try:
+        import xlsxwriter
+    except ImportError:
+        raise ExportError('XLSX export needs the xlsxwriter package.')
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd',
+        # user typed text stays text, never a formula or a link
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+    })
+    worksheet = workbook.add_worksheet()
+    for row_number, row in enumerate(rows(period, statuses)):
+        worksheet.write_row(row_number, 0, row)
+    workbook.close()
+
+
+def xlsx_file(period: str | None = None, statuses=None):
+    """Open temporary XLSX export, deleted as soon as it is closed."""
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    try:
+        write_xlsx(path, period, statuses)
+        return open(path, 'rb')
+    finally:
+        # the open file stays readable on POSIX, elsewhere the temp dir cleanup takes it
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -0,0 +1,132 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def content_hash(field_file) -> str:
+    digest = hashlib.sha256()
+    with field_file.open('rb') as source:
+        for chunk in source.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def rendition_name(image_hash: str, size: str) -> str:
+    extension = 'jpg' if settings.IMAGE_RENDITION_FORMAT == 'JPEG' else settings.IMAGE_RENDITION_FORMAT.lower()
+    return f'renditions/{image_hash[:2]}/{image_hash}_{size}.{extension}'
+
+
+def make_renditions(field_file) -> str:
+    """Save every size of ``field_file`` that is not stored yet, returns its content hash."""
+    image_hash = content_hash(field_file)
+    storage = field_file.storage
+    missing = {
+        size: dimensions for size, dimensions in settings.IMAGE_RENDITIONS.items()
+        if not storage.exists(rendition_name(image_hash, size))
+    }
+    if not missing:
+        return image_hash
+    with field_file.open('rb') as source:
+        original = Image.open(source)
+        original.load()
+    if settings.IMAGE_RENDITION_FORMAT == 'JPEG' and original.mode != 'RGB':
+        original = original.convert('RGB')
+    for size, dimensions in missing.items():
+        picture = original.copy()
+        picture.thumbnail(dimensions)
+        output = BytesIO()
+        picture.save(output, settings.IMAGE_RENDITION_FORMAT)
+        storage.save(rendition_name(image_hash, size), ContentFile(output.getvalue()))
+    return image_hash
+
+
+def process_image(model_label: str, pk, field_name: str, hash_field: str) -> None:
+    model = apps.get_model(model_label)
+    obj = model.objects.filter(pk=pk).only(field_name).first()
+    if obj is None:
+        return
+    field_file = getattr(obj, field_name)
+    image_hash = make_renditions(field_file) if field_file else ''
+    # the image may have been replaced while we worked, its own job will set the hash
+    changes = {hash_field: image_hash}
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        changes['updated_at'] = timezone.now()
+    if model.objects.filter(pk=pk, **{field_name: field_file.name or ''}).update(**changes):
+        versions.bump(model_label, [pk])
+
+
+def _run_in_worker(*args) -> None:
+    try:
+        process_image(*args)
+    except Exception:
+        logger.exception('Image processing failed for %s', args)
+    finally:
+        connections.close_all()
+
+
+def submit(*args) -> None:
+    global _executor
+    if not settings.IMAGE_PROCESSING_WORKERS:
+        process_image(*args)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PROCESSING_WORKERS,
+            thread_name_prefix='images',
+        )
+    _executor.submit(_run_in_worker, *args)
+
+
+class RenditionsMixin:
+    """Model mixin queuing sized renditions whenever an image in ``rendition_fields`` changes.
+
+    ``rendition_fields`` maps image field names to the field holding the
+    content hash of their renditions, which stays empty until they exist.
+    """
+    rendition_fields = {}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_images = {
+            name: instance.__dict__[name] or '' for name in cls.rendition_fields if name in instance.__dict__
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        saved_images = self.__dict__.setdefault('_saved_images', {})
+        changed = []
+        for field_name, hash_field in self.rendition_fields.items():
+            if field_name not in self.__dict__:
+                continue
+            field_file = getattr(self, field_name)
+            if not field_file._committed or (field_file.name or '') != saved_images.get(field_name, ''):
+                setattr(self, hash_field, '')
+                changed.append((field_name, hash_field))
+        super().save(*args, **kwargs)
+        for field_name, hash_field in changed:
+            saved_images[field_name] = getattr(self, field_name).name or ''
+            job = (self._meta.label, self.pk, field_name, hash_field)
+            transaction.on_commit(lambda job=job: submit(*job))
+
+    def rendition_url(self, field_name: str, size: str) -> str:
+        """URL of the ``size`` rendition, the original image until renditions are ready."""
+        field_file = getattr(self, field_name)
+        if not field_file:
+            return ''
+        image_hash = getattr(self, self.rendition_fields[field_name])
+        if not image_hash:
+            return field_file.url
+        return field_file.storage.url(rendition_name(image_hash, size))
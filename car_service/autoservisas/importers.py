@@ -0,0 +1,207 @@
+import csv
+import json
+from pathlib import Path
+from time import perf_counter
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from . import counters
+from . models import CarModel, Car, normalize_code, normalize_text
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.duplicates = 0
+        self.rejected = []
+        self.started = perf_counter()
+        self.elapsed = 0.0
+
+    def reject(self, line: int, reason: str) -> None:
+        self.rejected.append((line, reason))
+
+    def finish(self) -> 'ImportReport':
+        self.elapsed = perf_counter() - self.started
+        return self
+
+    @property
+    def rows(self) -> int:
+        return self.created + self.duplicates + len(self.rejected)
+
+    @property
+    def rate(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return '%d rows in %.1f s (%d rows/s): %d created, %d duplicates, %d rejected.' % (
+            self.rows, self.elapsed, self.rate, self.created, self.duplicates, len(self.rejected),
+        )
+
+
+class UnreadableRecord:
+    """Yielded by read_records() for a line it could not parse, the importers reject it."""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+
+
+def read_records(path, file_format: str | None = None):
+    """Yield ``(line number, record dict)`` from a CSV, JSON Lines or JSON array file.
+
+    CSV and JSON Lines are read a row at a time, a JSON array is loaded whole.
+    A malformed JSON line comes out as an ``UnreadableRecord``, the lines
+    around it still get imported.
+    """
+    path = Path(path)
+    file_format = file_format or path.suffix.lstrip('.').lower()
+    # utf-8-sig drops the byte order mark Excel starts its CSV files with
+    with path.open(newline='', encoding='utf-8-sig') as source:
+        if file_format == 'csv':
+            reader = csv.DictReader(source)
+            for record in reader:
+                yield reader.line_num, record
+        elif file_format in ('jsonl', 'ndjson'):
+            for line_number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as error:
+                    record = UnreadableRecord(f'bad JSON: {error}')
+                yield line_number, record
+        elif file_format == 'json':
+            yield from enumerate(json.load(source), 1)
+        else:
+            raise ValueError(f'Unknown input format {file_format!r}, use csv, jsonl or json.')
+
+
+def catalog_key(make, model, engine, year) -> tuple:
+    return normalize_text(make), normalize_text(model), normalize_text(engine), int(year)
+
+
+def _text(record: dict, name: str) -> str:
+    return str(record.get(name) or '').strip()
+
+
+def _not_a_record(record) -> str | None:
+    if isinstance(record, UnreadableRecord):
+        return record.reason
+    if not isinstance(record, dict):
+        return 'not an object'
+    return None
+
+
+def _invalid(obj, exclude=None) -> str | None:
+    """Field errors of ``obj`` in one line, bulk_create() checks nothing and SQLite ignores max_length."""
+    try:
+        # no uniqueness or constraint checks, each of those is a query per row
+        obj.full_clean(exclude=exclude, validate_unique=False, validate_constraints=False)
+    except ValidationError as error:
+        return '; '.join(f"{field}: {' '.join(messages)}" for field, messages in error.message_dict.items())
+    return None
+
+
+def _flush(model, batch: list, report: ImportReport) -> None:
+    if batch:
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+        report.created += len(batch)
+        batch.clear()
+
+
+def import_catalog(records, batch_size: int = 1000) -> ImportReport:
+    """Add car models missing from the catalogue, matched on (make, model, engine, year)."""
+    report = ImportReport()
+    known = {
+        catalog_key(*values)
+        for values in CarModel.objects.values_list('make', 'model', 'engine', 'year').iterator()
+    }
+    batch = []
+    for line, record in records:
+        reason = _not_a_record(record)
+        if reason:
+            report.reject(line, reason)
+            continue
+        make, model, engine = _text(record, 'make'), _text(record, 'model'), _text(record, 'engine')
+        if not make or not model:
+            report.reject(line, 'make and model are required')
+            continue
+        try:
+            year = int(record.get('year'))
+        except (TypeError, ValueError):
+            report.reject(line, f"bad year {record.get('year')!r}")
+            continue
+        key = catalog_key(make, model, engine, year)
+        if key in known:
+            report.duplicates += 1
+            continue
+        car_model = CarModel(
+            make=make, model=model, engine=engine or None, year=year,
+            normalized_make=key[0], normalized_model=key[1],
+        )
+        error = _invalid(car_model)
+        if error:
+            report.reject(line, error)
+            continue
+        known.add(key)
+        batch.append(car_model)
+        if len(batch) >= batch_size:
+            _flush(CarModel, batch, report)
+    _flush(CarModel, batch, report)
+    return report.finish()
+
+
+def import_fleet(records, customer, batch_size: int = 1000) -> ImportReport:
+    """Add ``customer``'s cars, skipping plates or VIN codes already known.
+
+    Each record names its car model by make, model, engine and year, which
+    must already be in the catalogue (see import_catalog).
+    """
+    report = ImportReport()
+    car_models = {
+        catalog_key(make, model, engine, year): pk
+        for pk, make, model, engine, year in CarModel.objects.values_list('pk', 'make', 'model', 'engine', 'year').iterator()
+    }
+    plates, vins = set(), set()
+    for plate, vin in Car.objects.values_list('normalized_plate', 'normalized_vin').iterator():
+        plates.add(plate)
+        vins.add(vin)
+    batch = []
+    for line, record in records:
+        reason = _not_a_record(record)
+        if reason:
+            report.reject(line, reason)
+            continue
+        plate, vin = _text(record, 'plate_number'), _text(record, 'vin_code')
+        if not plate or not vin:
+            report.reject(line, 'plate_number and vin_code are required')
+            continue
+        try:
+            key = catalog_key(record.get('make'), record.get('model'), record.get('engine'), record.get('year'))
+        except (TypeError, ValueError):
+            report.reject(line, f"bad year {record.get('year')!r}")
+            continue
+        if key not in car_models:
+            report.reject(line, 'car model not in the catalogue: %s %s %s %s' % key)
+            continue
+        normalized_plate, normalized_vin = normalize_code(plate), normalize_code(vin)
+        if normalized_plate in plates or normalized_vin in vins:
+            report.duplicates += 1
+            continue
+        car = Car(
+            plate_number=plate, vin_code=vin, car_model_id=car_models[key], customer=customer,
+            normalized_plate=normalized_plate, normalized_vin=normalized_vin,
+        )
+        # the car model and customer are known to exist, checking them would query
+        error = _invalid(car, exclude=['car_model', 'customer'])
+        if error:
+            report.reject(line, error)
+            continue
+        plates.add(normalized_plate)
+        vins.add(normalized_vin)
+        batch.append(car)
+        if len(batch) >= batch_size:
+            _flush(Car, batch, report)
+    _flush(Car, batch, report)
+    # bulk_create() sends no post_save signals
+    counters.adjust(Car, report.created)
+    return report.finish()
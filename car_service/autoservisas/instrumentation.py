@@ -0,0 +1,188 @@
+import logging
+import threading
+from collections import defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import perf_counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends import django as django_backend
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('queries', 'sql_ms', 'template_ms', 'total_ms', 'size')
+
+# 404s and scanner paths share one histogram entry, one per path would grow without bound
+UNRESOLVED = '<unresolved>'
+
+_current = ContextVar('instrumentation_sample', default=None)
+
+
+class Histogram:
+    """The latest ``samples`` measurements of every URL name, shared by the process."""
+
+    def __init__(self, samples: int):
+        self.samples = samples
+        self.lock = threading.Lock()
+        self.views = defaultdict(lambda: deque(maxlen=self.samples))
+
+    def add(self, url_name: str, sample: dict) -> None:
+        with self.lock:
+            self.views[url_name].append(sample)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.views.clear()
+
+    def report(self) -> dict:
+        with self.lock:
+            views = {name: list(samples) for name, samples in self.views.items()}
+        report = {}
+        for name, samples in sorted(views.items()):
+            report[name] = {'count': len(samples)}
+            for metric in METRICS:
+                values = sorted(sample[metric] for sample in samples)
+                report[name][metric] = {
+                    'p50': values[len(values) // 2],
+                    'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+                    'max': values[-1],
+                }
+        return report
+
+
+histogram = Histogram(getattr(settings, 'VIEW_INSTRUMENTATION_SAMPLES', 1000))
+
+
+def query_budget(url_name: str, method: str = 'GET') -> int:
+    """Budget of a request, ``VIEW_QUERY_BUDGETS`` covers page loads, form posts get the default."""
+    if method.upper() not in ('GET', 'HEAD'):
+        return settings.DEFAULT_VIEW_QUERY_BUDGET
+    return settings.VIEW_QUERY_BUDGETS.get(url_name, settings.DEFAULT_VIEW_QUERY_BUDGET)
+
+
+def _instrumented_render(render):
+    def instrumented(self, *args, **kwargs):
+        sample = _current.get()
+        if sample is None or sample['_rendering']:
+            return render(self, *args, **kwargs)
+        # nested renders (includes, inclusion tags) count towards the outer one
+        sample['_rendering'] = True
+        started = perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            sample['template_ms'] += (perf_counter() - started) * 1000
+            sample['_rendering'] = False
+    instrumented.instrumented = True
+    return instrumented
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and the time spent running them."""
+
+    def __init__(self, sample: dict):
+        self.sample = sample
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sample['queries'] += 1
+            self.sample['sql_ms'] += (perf_counter() - started) * 1000
+
+
+class InstrumentationMiddleware:
+    """Record queries, SQL time, template time and response size per URL name.
+
+    Views going over their query budget (``VIEW_QUERY_BUDGETS`` for GET and
+    HEAD, ``DEFAULT_VIEW_QUERY_BUDGET`` otherwise) are logged as warnings.
+
+    Under ASGI it stays async, a sync middleware would push async views into
+    a thread. The query timers are installed in the thread the request's
+    ``sync_to_async`` calls, the async ORM included, run in.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.VIEW_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        render = django_backend.Template.render
+        if not getattr(render, 'instrumented', False):
+            django_backend.Template.render = _instrumented_render(render)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sample, token, started = self.start()
+        try:
+            with ExitStack() as stack:
+                self.time_queries(stack, sample)
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, sample, started)
+        return response
+
+    async def __acall__(self, request):
+        sample, token, started = self.start()
+        stack = ExitStack()
+        try:
+            # connections are per thread, async code queries in the request's sync_to_async thread
+            await sync_to_async(self.time_queries)(stack, sample)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        self.finish(request, response, sample, started)
+        return response
+
+    def start(self):
+        sample = {metric: 0 for metric in METRICS}
+        sample['_rendering'] = False
+        return sample, _current.set(sample), perf_counter()
+
+    def time_queries(self, stack: ExitStack, sample: dict) -> None:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(QueryTimer(sample)))
+
+    def finish(self, request, response, sample: dict, started: float) -> None:
+        sample['total_ms'] = (perf_counter() - started) * 1000
+        del sample['_rendering']
+        if not response.streaming:
+            sample['size'] = len(response.content)
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.view_name if match and match.view_name else UNRESOLVED
+        histogram.add(url_name, sample)
+        budget = query_budget(url_name, request.method)
+        if sample['queries'] > budget:
+            logger.warning(
+                '%s ran %d queries, budget is %d (%.1f ms in SQL)',
+                url_name, sample['queries'], budget, sample['sql_ms'],
+            )
+
+
+def assert_query_budget(client, path: str, budget: int | None = None, method: str = 'get', **kwargs):
+    """Request ``path`` with the test ``client``, failing when it runs more queries than its budget.
+
+    Returns the response, the budget defaults to the one configured for the URL name.
+    """
+    if budget is None:
+        budget = query_budget(resolve(path).view_name, method)
+    with CaptureQueriesContext(connections['default']) as queries:
+        response = getattr(client, method)(path, **kwargs)
+    if len(queries) > budget:
+        raise AssertionError('%s ran %d queries, budget is %d:\n%s' % (
+            path, len(queries), budget, '\n'.join(query['sql'] for query in queries),
+        ))
+    return response
@@ -0,0 +1,116 @@
+import threading
+from time import perf_counter
+from typing import Any
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import OperationalError, connection, transaction
+from django.db.backends.signals import connection_created
+from autoservisas.db import tune_sqlite
+from autoservisas.models import Order, OrderComment
+
+MARKER = 'benchmark_db_writes'
+
+# what SQLite does without autoservisas.db.tune_sqlite
+SQLITE_DEFAULTS = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'mmap_size': 0}
+
+
+class Command(BaseCommand):
+    help = "Measure concurrent write (and read) throughput of the configured database."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writes', type=int, default=200, help="Writes per writer thread.")
+        parser.add_argument(
+            '--sqlite-mode', choices=['tuned', 'default'], default='tuned',
+            help="SQLite only: SQLITE_PRAGMAS or SQLite's own defaults.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        order_id = Order.objects.values_list('pk', flat=True).first()
+        if order_id is None:
+            raise CommandError('Needs at least one order, see generate_data.')
+        if connection.vendor != 'sqlite':
+            self.run(order_id, {}, options)
+            return
+        pragmas = settings.SQLITE_PRAGMAS if options['sqlite_mode'] == 'tuned' else SQLITE_DEFAULTS
+        # tune_sqlite would give every thread's connection the tuned pragmas, WAL included
+        tuned = connection_created.disconnect(dispatch_uid='autoservisas_tune_sqlite')
+        try:
+            # journal mode is kept in the database file and needs the only connection to change
+            connection.close()
+            with connection.cursor() as cursor:
+                cursor.execute(f"PRAGMA journal_mode = {pragmas['journal_mode']}")
+            connection.close()
+            self.run(order_id, pragmas, options)
+        finally:
+            if tuned:
+                connection_created.connect(tune_sqlite, dispatch_uid='autoservisas_tune_sqlite')
+
+    def run(self, order_id: int, pragmas: dict, options: dict) -> None:
+        stats = {'writes': 0, 'reads': 0, 'errors': 0}
+        journal_modes = set()
+        lock = threading.Lock()
+        writing = threading.Event()
+        writing.set()
+
+        def apply_pragmas():
+            if connection.vendor != 'sqlite':
+                return
+            with connection.cursor() as cursor:
+                for pragma, value in pragmas.items():
+                    if pragma != 'journal_mode':
+                        cursor.execute(f'PRAGMA {pragma} = {value}')
+                # what the thread really runs in, the mode set up front
+                cursor.execute('PRAGMA journal_mode')
+                with lock:
+                    journal_modes.add(cursor.fetchone()[0].upper())
+
+        def writer():
+            apply_pragmas()
+            done = errors = 0
+            try:
+                for _ in range(options['writes']):
+                    try:
+                        # bulk_create sends no post_save, a real comment would queue a customer email
+                        with transaction.atomic():
+                            OrderComment.objects.bulk_create([OrderComment(order_id=order_id, content=MARKER)])
+                        done += 1
+                    except OperationalError:
+                        errors += 1
+            finally:
+                connection.close()
+                with lock:
+                    stats['writes'] += done
+                    stats['errors'] += errors
+
+        def reader():
+            apply_pragmas()
+            done = 0
+            try:
+                while writing.is_set():
+                    list(OrderComment.objects.filter(order_id=order_id).values_list('pk', flat=True)[:50])
+                    done += 1
+            finally:
+                connection.close()
+                with lock:
+                    stats['reads'] += done
+
+        writers = [threading.Thread(target=writer) for _ in range(options['writers'])]
+        readers = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        started = perf_counter()
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = perf_counter() - started
+        writing.clear()
+        for thread in readers:
+            thread.join()
+        OrderComment.objects.filter(content=MARKER).delete()
+        mode = connection.vendor
+        if connection.vendor == 'sqlite':
+            mode = f"{options['sqlite_mode']} ({', '.join(sorted(journal_modes))})"
+        self.stdout.write('%s: %d writes/s, %d reads/s, %d failed writes in %.2f s' % (
+            mode, stats['writes'] / elapsed, stats['reads'] / elapsed, stats['errors'], elapsed,
+        ))
@@ -0,0 +1,17 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandParser
+from autoservisas.benchmarks import compare_projections
+
+
+class Command(BaseCommand):
+    help = "Compare database transfer and memory of list pages loading full rows and the list projections."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--page-size', type=int, default=500)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        for name, costs in compare_projections(options['page_size']).items():
+            for kind, cost in costs.items():
+                self.stdout.write('%-10s %-4s %5d rows %3d columns %10d bytes %9.1f KB peak %8.2f ms' % (
+                    name, kind, cost['rows'], cost['columns'], cost['bytes'], cost['peak_kb'], cost['ms'],
+                ))
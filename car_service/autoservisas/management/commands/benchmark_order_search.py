@@ -0,0 +1,32 @@
+from statistics import median
+from time import perf_counter
+from typing import Any
+from django.core.management.base import BaseCommand, CommandParser
+from autoservisas.models import Order
+from autoservisas.search import search_orders
+
+DEFAULT_QUERIES = ['2023', '2023-06', '2023-06-07', '2023-01..2023-03', 'ABC', 'ABC123', 'jonas', 'jonas jonaitis']
+
+
+class Command(BaseCommand):
+    help = "Time OrderListView search queries against the current database."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('queries', nargs='*', default=DEFAULT_QUERIES)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=3)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        self.stdout.write('%d orders in the database.' % Order.objects.count())
+        for query in options['queries']:
+            timings = []
+            for _ in range(options['repeat']):
+                started = perf_counter()
+                # what one list page costs: the count for the paginator and the page rows
+                qs = search_orders(Order.objects.all(), query)
+                qs.count()
+                list(qs[:options['page_size']])
+                timings.append(perf_counter() - started)
+            self.stdout.write('%-20s median %8.2f ms, max %8.2f ms' % (
+                query, median(timings) * 1000, max(timings) * 1000,
+            ))
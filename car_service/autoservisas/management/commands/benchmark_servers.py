@@ -0,0 +1,41 @@
+import shlex
+import sys
+from importlib.util import find_spec
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from autoservisas.benchmarks import compare_servers, free_port
+
+
+class Command(BaseCommand):
+    help = "Load the read-heavy pages concurrently on a WSGI server with the sync views and an ASGI server with the async views."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--requests', type=int, default=200, help="Requests per page.")
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument(
+            '--wsgi-command', default=f'{sys.executable} manage.py runserver --noreload 127.0.0.1:{{port}}',
+            help="Command serving the site over WSGI, {port} is filled in.",
+        )
+        parser.add_argument(
+            '--asgi-command', default=f'{sys.executable} -m uvicorn car_service.asgi:application --port {{port}}',
+            help="Command serving the site over ASGI, {port} is filled in.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if 'uvicorn' in options['asgi_command'] and find_spec('uvicorn') is None:
+            raise CommandError("uvicorn is not installed, pip install uvicorn or pass --asgi-command.")
+        servers = {}
+        for name, async_views in [('wsgi', '0'), ('asgi', '1')]:
+            port = free_port()
+            command = shlex.split(options[f'{name}_command'].format(port=port))
+            servers[name] = (command, port, {'DJANGO_ASYNC_VIEWS': async_views})
+        try:
+            results = compare_servers(servers, options['requests'], options['concurrency'])
+        except RuntimeError as error:
+            raise CommandError(str(error))
+        self.stdout.write('%-6s %-18s %10s %8s %8s' % ('server', 'page', 'req/s', 'p50 ms', 'p95 ms'))
+        for server, pages in results.items():
+            for name, result in pages.items():
+                self.stdout.write('%-6s %-18s %10.1f %8.2f %8.2f' % (
+                    server, name, result['requests_per_second'], result['p50_ms'], result['p95_ms'],
+                ))
@@ -0,0 +1,30 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from autoservisas import exports
+
+
+class Command(BaseCommand):
+    help = "Export order entries for accounting as CSV or XLSX, streaming rows with flat memory use."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--period', help="Date, month, year or from..to range, e.g. 2023-06.")
+        parser.add_argument('--status', type=int, action='append', help="Order status, can be repeated.")
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--output', help="File to write, CSV goes to stdout without it.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        try:
+            if options['format'] == 'xlsx':
+                if not options['output']:
+                    raise CommandError('XLSX export needs --output.')
+                exports.write_xlsx(options['output'], options['period'], options['status'])
+                return
+            exports.entries(options['period'], options['status'])
+            if not options['output']:
+                for line in exports.csv_lines(options['period'], options['status']):
+                    self.stdout.write(line, ending='')
+                return
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(exports.csv_lines(options['period'], options['status']))
+        except exports.ExportError as error:
+            raise CommandError(error)
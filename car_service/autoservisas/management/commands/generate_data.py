@@ -0,0 +1,197 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from time import perf_counter
+from typing import Any
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import models, transaction
+from autoservisas import counters, reports
+from autoservisas.models import CarModel, Car, Order, Service, OrderEntry, OrderComment, normalize_code
+from autoservisas.sanitize import clean_html
+from user_profile.models import NAME_FIELDS, Profile
+
+User = get_user_model()
+
+MAKES = {
+    'Audi': ['A3', 'A4', 'A6', 'Q5'],
+    'BMW': ['116i', '320d', '520d', 'X5'],
+    'Volkswagen': ['Golf', 'Passat', 'Touran', 'Tiguan'],
+    'Toyota': ['Corolla', 'Avensis', 'RAV4', 'Prius'],
+    'Opel': ['Astra', 'Vectra', 'Zafira'],
+    'Skoda': ['Octavia', 'Fabia', 'Superb'],
+}
+ENGINES = ['1.6', '1.9 TDI', '2.0', '2.0 TDI', '2.5', 'hybrid']
+SERVICES = [
+    ('Oil change', '45.00'), ('Tyre change', '30.00'), ('Brake pads', '80.00'),
+    ('Diagnostics', '25.00'), ('Timing belt', '320.00'), ('Air conditioning', '60.00'),
+    ('Wheel alignment', '40.00'), ('Battery replacement', '120.00'), ('Suspension repair', '250.00'),
+    ('Exhaust repair', '150.00'), ('Clutch replacement', '480.00'), ('Car wash', '15.00'),
+]
+NOTE_SENTENCES = [
+    'Customer asks to check the brakes before winter.', 'Rear left tyre loses pressure slowly.',
+    'Uses <strong>only</strong> original parts.', 'Oil leak under the engine, see photos.',
+    'Call before doing anything over <em>200 EUR</em>.', 'Spare key is kept at the reception.',
+    'Check engine light comes on when cold.', 'Squeaking noise from the front suspension on bumps.',
+]
+PLATE_LETTERS = 'ABCDEFGHJKLMNPRSTUVZ'
+VIN_CHARACTERS = 'ABCDEFGHJKLMNPRSTUVWXYZ0123456789'
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic users, cars, orders, entries and comments."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--cars', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--max-entries', type=int, default=8, help="Most entries on one order.")
+        parser.add_argument('--comments', type=int, default=2000)
+        parser.add_argument('--notes', type=float, default=0.3, help="Share of cars with a service note.")
+        parser.add_argument('--years', type=int, default=3, help="How far back order dates go.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # own stream, so notes do not shift the rest of the data of a seed
+        self.note_random = random.Random(options['seed'])
+        self.notes = options['notes']
+        started = perf_counter()
+        services = self.ensure_catalogue()
+        users = self.create_users(options['users'])
+        cars = self.create_cars(options['cars'], users)
+        orders = self.create_orders(options['orders'], cars, services, options['max_entries'], options['years'])
+        self.create_comments(options['comments'], orders, users)
+        for model in (Service, OrderEntry, Car):
+            counters.invalidate(model)
+        # entries skipped the incremental upkeep and order dates were backdated
+        reports.rebuild()
+        self.stdout.write(self.style.SUCCESS('Data generated in %.1f s.' % (perf_counter() - started)))
+
+    def skewed(self, population: list) -> Any:
+        """Pick from ``population`` with a long tail, a few items get most of the picks."""
+        index = int(self.random.paretovariate(1.2)) - 1
+        return population[index % len(population)]
+
+    def in_batches(self, objs):
+        for start in range(0, len(objs), self.batch_size):
+            yield objs[start:start + self.batch_size]
+
+    def ensure_catalogue(self) -> list[Service]:
+        if not CarModel.objects.exists():
+            car_models = [
+                CarModel(make=make, model=model, engine=self.random.choice(ENGINES), year=self.random.randint(1998, 2023))
+                for make, models_ in MAKES.items() for model in models_
+            ]
+            for car_model in car_models:
+                car_model.save()
+        if not Service.objects.exists():
+            Service.objects.bulk_create(Service(name=name, price=Decimal(price)) for name, price in SERVICES)
+        return list(Service.objects.all())
+
+    def create_users(self, count: int) -> list[int]:
+        password = make_password(None)
+        first_user = User.objects.count()
+        users = [
+            User(
+                username=f'customer{first_user + number}',
+                first_name=self.random.choice(['Jonas', 'Petras', 'Ona', 'Rūta', 'Tomas', 'Asta', 'Mantas']),
+                last_name=self.random.choice(['Jonaitis', 'Petraitis', 'Kazlauskas', 'Stankevičius', 'Vasiliauskas']),
+                email=f'customer{first_user + number}@example.com',
+                password=password,
+            ) for number in range(count)
+        ]
+        for batch in self.in_batches(users):
+            User.objects.bulk_create(batch)
+        # bulk_create skips the signal that fills the profile search names
+        users = list(User.objects.filter(profile__isnull=True).only('pk', *NAME_FIELDS))
+        for batch in self.in_batches(users):
+            Profile.objects.bulk_create(Profile(user_id=user.pk, **Profile.normalized_names(user)) for user in batch)
+        self.stdout.write('%d users created.' % count)
+        return list(User.objects.values_list('pk', flat=True))
+
+    def create_cars(self, count: int, user_ids: list[int]) -> list[int]:
+        car_model_ids = list(CarModel.objects.values_list('pk', flat=True))
+        cars = []
+        for _ in range(count):
+            plate = ''.join(self.random.choices(PLATE_LETTERS, k=3)) + '%03d' % self.random.randint(0, 999)
+            vin = ''.join(self.random.choices(VIN_CHARACTERS, k=17))
+            cars.append(Car(
+                plate_number=plate,
+                vin_code=vin,
+                normalized_plate=normalize_code(plate),
+                normalized_vin=normalize_code(vin),
+                car_model_id=self.skewed(car_model_ids),
+                # fleet customers own many cars
+                customer_id=self.skewed(user_ids),
+            ))
+            if self.note_random.random() < self.notes:
+                car = cars[-1]
+                car.note = self.note()
+                car.note_html, car.note_excerpt = clean_html(car.note)
+        for batch in self.in_batches(cars):
+            Car.objects.bulk_create(batch)
+        self.stdout.write('%d cars created.' % count)
+        return list(Car.objects.values_list('pk', flat=True))
+
+    def note(self) -> str:
+        paragraphs = [
+            '<p>%s</p>' % ' '.join(self.note_random.choices(NOTE_SENTENCES, k=self.note_random.randint(2, 8)))
+            for _ in range(self.note_random.randint(1, 12))
+        ]
+        return ''.join(paragraphs)[:4000]
+
+    def create_orders(self, count: int, car_ids: list[int], services: list[Service], max_entries: int, years: int) -> list[int]:
+        today = date.today()
+        statuses = [status for status, label in Order.STATUS_CHOICES]
+        created_ids = []
+        for batch_start in range(0, count, self.batch_size):
+            batch_count = min(self.batch_size, count - batch_start)
+            orders = []
+            lines = []
+            for _ in range(batch_count):
+                order_date = today - timedelta(days=int(self.random.triangular(0, 365 * years, 0)))
+                entries = [
+                    (self.random.choice(services), Decimal(self.random.choice([1, 1, 1, 2, 4])))
+                    for _ in range(self.random.randint(1, max_entries))
+                ]
+                # older orders are mostly done, the recent ones still in the workshop
+                status = statuses[4] if (today - order_date).days > 30 else self.random.choice(statuses)
+                orders.append(Order(
+                    car_id=self.skewed(car_ids),
+                    status=status,
+                    due_back=order_date + timedelta(days=self.random.randint(1, 14)),
+                    order_sum=sum(service.price * quantity for service, quantity in entries),
+                ))
+                lines.append((order_date, entries))
+            with transaction.atomic():
+                orders = Order.objects.bulk_create(orders)
+                for order, (order_date, entries) in zip(orders, lines):
+                    order.date = order_date
+                Order.objects.bulk_update(orders, ['date'])
+                # order_sum is already right, skip the incremental sum maintenance
+                models.QuerySet(OrderEntry).bulk_create([
+                    OrderEntry(order=order, service=service, quantity=quantity, price=service.price, total=service.price * quantity)
+                    for order, (order_date, entries) in zip(orders, lines)
+                    for service, quantity in entries
+                ])
+            created_ids.extend(order.pk for order in orders)
+            self.stdout.write('%d / %d orders created.' % (batch_start + batch_count, count))
+        return created_ids
+
+    def create_comments(self, count: int, order_ids: list[int], user_ids: list[int]) -> None:
+        if not order_ids:
+            return
+        comments = [
+            OrderComment(
+                order_id=self.skewed(order_ids),
+                commenter_id=self.random.choice(user_ids),
+                content=self.random.choice(['When will it be ready?', 'Fixed, ready for pick up.', 'Waiting for parts.', 'Thanks!']),
+            ) for _ in range(count)
+        ]
+        for batch in self.in_batches(comments):
+            OrderComment.objects.bulk_create(batch)
+        self.stdout.write('%d comments created.' % count)
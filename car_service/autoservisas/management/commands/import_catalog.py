@@ -0,0 +1,24 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from autoservisas import importers
+
+
+class Command(BaseCommand):
+    help = "Import car models from a CSV, JSON Lines or JSON file with make, model, engine and year."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl', 'ndjson', 'json'], help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        try:
+            report = importers.import_catalog(
+                importers.read_records(options['path'], options['format']),
+                batch_size=options['batch_size'],
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        for line, reason in report.rejected:
+            self.stderr.write('line %d: %s' % (line, reason))
+        self.stdout.write(self.style.SUCCESS(report.summary()))
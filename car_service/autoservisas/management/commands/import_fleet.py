@@ -0,0 +1,32 @@
+from typing import Any
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from autoservisas import importers
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Import a customer's cars from a CSV, JSON Lines or JSON file with plate_number, vin_code, make, model, engine and year."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('path')
+        parser.add_argument('--customer', required=True, help="Username owning the cars.")
+        parser.add_argument('--format', choices=['csv', 'jsonl', 'ndjson', 'json'], help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        customer = User.objects.filter(username=options['customer']).first()
+        if customer is None:
+            raise CommandError('No user %r.' % options['customer'])
+        try:
+            report = importers.import_fleet(
+                importers.read_records(options['path'], options['format']),
+                customer,
+                batch_size=options['batch_size'],
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        for line, reason in report.rejected:
+            self.stderr.write('line %d: %s' % (line, reason))
+        self.stdout.write(self.style.SUCCESS(report.summary()))
@@ -0,0 +1,43 @@
+from typing import Any
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandParser
+from autoservisas.images import RenditionsMixin, process_image
+
+
+class Command(BaseCommand):
+    help = "Make the sized renditions of images uploaded before they existed or whose processing failed."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        made = failed = 0
+        for model in apps.get_models():
+            if not issubclass(model, RenditionsMixin):
+                continue
+            for field_name, hash_field in model.rendition_fields.items():
+                # images without a hash are still served at full size
+                missing = (
+                    model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                    .filter(**{hash_field: ''}).order_by('pk')
+                )
+                last_pk = None
+                done = 0
+                while True:
+                    batch = missing if last_pk is None else missing.filter(pk__gt=last_pk)
+                    pks = list(batch.values_list('pk', flat=True)[:options['batch_size']])
+                    if not pks:
+                        break
+                    last_pk = pks[-1]
+                    done += len(pks)
+                    for pk in pks:
+                        try:
+                            process_image(model._meta.label, pk, field_name, hash_field)
+                        except Exception as error:
+                            # a missing or broken file keeps the original in use, the rest go on
+                            self.stderr.write('%s %s %s: %s' % (model._meta.label, pk, field_name, error))
+                            failed += 1
+                        else:
+                            made += 1
+                    self.stdout.write('%s.%s: %d images done.' % (model._meta.label, field_name, done))
+        self.stdout.write(self.style.SUCCESS('%d images processed, %d failed.' % (made, failed)))
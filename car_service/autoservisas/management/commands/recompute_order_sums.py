@@ -0,0 +1,25 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandParser
+from autoservisas.models import Order
+
+
+class Command(BaseCommand):
+    help = "Recompute Order.order_sum from order entries and repair orders that drifted."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('order_ids', nargs='*', type=int, help="Only check these orders.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Only report drifted orders.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        orders = Order.objects.all()
+        if options['order_ids']:
+            orders = orders.filter(pk__in=options['order_ids'])
+        drifted_count = orders.recompute_sums(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write('%d order sums have drifted.' % drifted_count)
+        else:
+            self.stdout.write(self.style.SUCCESS('%d order sums repaired.' % drifted_count))
@@ -0,0 +1,20 @@
+from time import perf_counter
+from typing import Any
+from django.core.management.base import BaseCommand, CommandParser
+from autoservisas import reports
+
+
+class Command(BaseCommand):
+    help = "Recompute report rollups of the days changed since the last run, or of all days with --rebuild."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--rebuild', action='store_true', help="Drop the rollups and recompute every day.")
+        parser.add_argument('--batch-size', type=int, default=reports.DAYS_PER_BATCH, help="Days per transaction.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        started = perf_counter()
+        if options['rebuild']:
+            days = reports.rebuild(options['batch_size'])
+        else:
+            days = reports.refresh(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('%d days refreshed in %.1f s.' % (days, perf_counter() - started)))
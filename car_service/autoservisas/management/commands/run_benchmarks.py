@@ -0,0 +1,31 @@
+import json
+from typing import Any
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from autoservisas import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Time the key pages through the test client and write a JSON report, optionally comparing it with an earlier one."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--output', help="Write the JSON report to this file.")
+        parser.add_argument('--compare', help="Earlier JSON report to compare with.")
+        parser.add_argument('--threshold', type=float, default=20, help="Allowed p50 slowdown in percent.")
+        parser.add_argument('--host', default='localhost', help="Host name sent with the requests, must be allowed.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        report = benchmarks.run(repeat=options['repeat'], host=options['host'])
+        self.stdout.write('%-24s %6s %8s %8s %8s %9s' % ('page', 'status', 'queries', 'p50 ms', 'p95 ms', 'bytes'))
+        for name, result in report['results'].items():
+            self.stdout.write('%-24s %6d %8d %8.2f %8.2f %9d' % (
+                name, result['status'], result['queries'], result['p50_ms'], result['p95_ms'], result['bytes'],
+            ))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        if options['compare']:
+            regressions = benchmarks.compare(benchmarks.load(options['compare']), report, options['threshold'])
+            if regressions:
+                raise CommandError('Regressions:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions.'))
@@ -0,0 +1,23 @@
+import time
+from typing import Any
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from autoservisas import notifications
+
+
+class Command(BaseCommand):
+    help = "Send the queued customer emails in batches over one mail connection."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="Keep polling the outbox instead of exiting.")
+        parser.add_argument('--interval', type=float, default=10, help="Seconds between polls with --loop.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        while True:
+            sent, failed = notifications.send_pending(options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS('%d emails sent, %d failed.' % (sent, failed)))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
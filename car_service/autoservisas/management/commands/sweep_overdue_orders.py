@@ -0,0 +1,32 @@
+from typing import Any
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+from autoservisas import notifications
+from autoservisas.models import Order
+
+
+class Command(BaseCommand):
+    help = "Queue apology emails to the customers of overdue orders, send them with send_outbox."
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help="Only count the overdue orders.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        overdue = Order.objects.overdue().exclude(customer__email='').filter(customer__isnull=False)
+        last_pk = 0
+        swept = 0
+        while True:
+            batch = list(
+                overdue.filter(pk__gt=last_pk).select_related('customer', 'car')
+                .order_by('pk')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            swept += len(batch)
+            if not options['dry_run']:
+                with transaction.atomic():
+                    notifications.queue(filter(None, map(notifications.overdue_email, batch)))
+            self.stdout.write('%d overdue orders swept.' % swept)
+        self.stdout.write(self.style.SUCCESS('%d overdue orders swept.' % swept))
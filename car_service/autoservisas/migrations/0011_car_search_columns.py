@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:13
+
+from django.db import migrations, models
+
+
+def normalize(value, separator):
+    return separator.join((value or "").split()).upper()
+
+
+def fill_columns(model, sources, batch_size=1000):
+    """Fill normalized_<name> from each source field in batches."""
+    fields = [f'normalized_{name}' for name, source, separator in sources]
+    batch = []
+    for obj in model.objects.only(*[source for name, source, separator in sources]).iterator(chunk_size=batch_size):
+        for name, source, separator in sources:
+            setattr(obj, f'normalized_{name}', normalize(getattr(obj, source), separator))
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, fields)
+
+
+def fill_search_columns(apps, schema_editor):
+    fill_columns(apps.get_model('autoservisas', 'CarModel'), [('make', 'make', ' '), ('model', 'model', ' ')])
+    fill_columns(apps.get_model('autoservisas', 'Car'), [('plate', 'plate_number', ''), ('vin', 'vin_code', '')])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoservisas', '0010_alter_ordercomment_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='normalized_plate',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='normalized_vin',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='carmodel',
+            name='normalized_make',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='carmodel',
+            name='normalized_model',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_search_columns, migrations.RunPython.noop),
+    ]
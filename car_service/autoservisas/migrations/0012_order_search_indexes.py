@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoservisas', '0011_car_search_columns'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='date',
+            field=models.DateField(auto_now_add=True, db_index=True, verbose_name='date'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'date'], name='order_status_date_idx'),
+        ),
+    ]
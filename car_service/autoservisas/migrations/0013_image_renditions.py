@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoservisas', '0012_order_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='car_img_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
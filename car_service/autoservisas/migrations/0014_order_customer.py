@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('autoservisas', '0013_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='customer',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to=settings.AUTH_USER_MODEL, verbose_name='customer'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'date'], name='order_customer_date_idx'),
+        ),
+    ]
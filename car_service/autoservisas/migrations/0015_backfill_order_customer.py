@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 10000
+
+
+def backfill_order_customer(apps, schema_editor):
+    Order = apps.get_model('autoservisas', 'Order')
+    Car = apps.get_model('autoservisas', 'Car')
+    car_customer = Car.objects.filter(pk=OuterRef('car_id')).values('customer_id')[:1]
+    last_pk = 0
+    while True:
+        # each batch commits on its own, the migration is not atomic
+        batch_ends = list(
+            Order.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[BATCH_SIZE - 1:BATCH_SIZE]
+        )
+        batch_end = batch_ends[0] if batch_ends else None
+        batch = Order.objects.filter(pk__gt=last_pk)
+        if batch_end is not None:
+            batch = batch.filter(pk__lte=batch_end)
+        batch.update(customer_id=Subquery(car_customer))
+        if batch_end is None:
+            return
+        last_pk = batch_end
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('autoservisas', '0014_order_customer'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_customer, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def queue_order_days(apps, schema_editor):
+    # refresh_reports fills the rollups of the queued days
+    Order = apps.get_model('autoservisas', 'Order')
+    ReportDay = apps.get_model('autoservisas', 'ReportDay')
+    days = Order.objects.order_by('date').values_list('date', flat=True).distinct()
+    ReportDay.objects.bulk_create((ReportDay(day=day) for day in days), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoservisas', '0015_backfill_order_customer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('status', models.PositiveBigIntegerField(choices=[(0, 'Registered'), (1, 'Waiting'), (2, 'Being fixed'), (3, 'Fixed'), (4, 'Returned'), (5, 'Canceled')], verbose_name='status')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='orders')),
+                ('order_sum', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='order sum')),
+            ],
+            options={
+                'verbose_name': 'order status rollup',
+                'verbose_name_plural': 'order status rollups',
+                'ordering': ['day', 'status'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReportDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='day')),
+            ],
+            options={
+                'verbose_name': 'report day',
+                'verbose_name_plural': 'report days',
+            },
+        ),
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('make', models.CharField(max_length=100, verbose_name='make')),
+                ('entries', models.PositiveIntegerField(default=0, verbose_name='entries')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='quantity')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='revenue')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='autoservisas.service', verbose_name='service')),
+            ],
+            options={
+                'verbose_name': 'revenue rollup',
+                'verbose_name_plural': 'revenue rollups',
+                'ordering': ['day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='orderstatusrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'status'), name='order_status_rollup_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='revenuerollup',
+            constraint=models.UniqueConstraint(fields=('day', 'service', 'make'), name='revenue_rollup_unique'),
+        ),
+        migrations.RunPython(queue_order_days, migrations.RunPython.noop),
+    ]
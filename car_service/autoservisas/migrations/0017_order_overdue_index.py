@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoservisas', '0016_reports'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status__in', (0, 1, 2))), fields=['due_back'], name='order_overdue_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:30
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoservisas', '0017_order_overdue_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True, verbose_name='key')),
+                ('to', models.EmailField(max_length=254, verbose_name='to')),
+                ('subject', models.CharField(max_length=255, verbose_name='subject')),
+                ('body', models.TextField(verbose_name='body')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('send_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='send after')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='last error')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='sent')),
+            ],
+            options={
+                'verbose_name': 'outbox email',
+                'verbose_name_plural': 'outbox emails',
+                'ordering': ['send_after', 'id'],
+                'indexes': [models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['send_after'], name='outbox_pending_idx')],
+            },
+        ),
+    ]
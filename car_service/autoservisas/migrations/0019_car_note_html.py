@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:32
+
+from django.db import migrations, models
+from autoservisas.sanitize import clean_html
+
+
+def clean_notes(apps, schema_editor, batch_size=1000):
+    Car = apps.get_model('autoservisas', 'Car')
+    batch = []
+    for car in Car.objects.exclude(note__isnull=True).exclude(note='').only('note').iterator(chunk_size=batch_size):
+        car.note_html, car.note_excerpt = clean_html(car.note)
+        batch.append(car)
+        if len(batch) >= batch_size:
+            Car.objects.bulk_update(batch, ['note_html', 'note_excerpt'])
+            batch = []
+    if batch:
+        Car.objects.bulk_update(batch, ['note_html', 'note_excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoservisas', '0018_outbox_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='note_excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='note_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(clean_notes, migrations.RunPython.noop),
+    ]
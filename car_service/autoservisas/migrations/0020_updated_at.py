@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoservisas', '0019_car_note_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='updated'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='updated'),
+        ),
+        migrations.AddField(
+            model_name='ordercomment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='updated'),
+        ),
+        migrations.AddField(
+            model_name='orderentry',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='updated'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoservisas', '0020_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='carmodel',
+            index=models.Index(fields=['make', 'id'], name='carmodel_make_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoservisas', '0021_carmodel_make_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.PositiveBigIntegerField(choices=[(0, 'Registered'), (1, 'Waiting'), (2, 'Being fixed'), (3, 'Fixed'), (4, 'Returned'), (5, 'Canceled')], verbose_name='status')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='autoservisas.order')),
+            ],
+            options={
+                'verbose_name': 'order status event',
+                'verbose_name_plural': 'order status events',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -1,35 +1,87 @@
+from collections import defaultdict
+from contextvars import ContextVar
+from decimal import Decimal
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from datetime import date
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
+from django.utils import timezone
 from tinymce.models import HTMLField
+from . import counters, versions
+from . images import RenditionsMixin
+from . sanitize import clean_html
 
 User = get_user_model()
 
+# Set while OrderEntryQuerySet.delete() runs, so the post_delete receiver
+# leaves order sums to the grouped update done by the queryset itself.
+bulk_entry_delete = ContextVar("bulk_entry_delete", default=False)
+
+
+# registered, waiting and being fixed, the orders still in the workshop
+OPEN_STATUSES = (0, 1, 2)
+
+
+def normalize_code(value):
+    """Plate numbers and VIN codes are compared upper-cased and without whitespace."""
+    return "".join((value or "").split()).upper()
+
+
+def normalize_text(value):
+    return " ".join((value or "").split()).upper()
+
 
 class CarModel(models.Model):
     make = models.CharField(_("make"), max_length=100)
     model = models.CharField(_("model"), max_length=100)
     engine = models.CharField(_("engine"), max_length=100, null=True, blank=True)
     year = models.PositiveIntegerField(_("year"))
+    normalized_make = models.CharField(max_length=100, editable=False, db_index=True, default="")
+    normalized_model = models.CharField(max_length=100, editable=False, db_index=True, default="")
 
     class Meta:
         ordering = ["make"]
+        indexes = [
+            # car models in make order, ties by their own id; the car list reads car models
+            # through it for its make ordering and range, then their cars by the car_model FK
+            models.Index(fields=["make", "id"], name="carmodel_make_idx"),
+        ]
         verbose_name = _("car model")
         verbose_name_plural = _("car models")
 
     def __str__(self):
         return f"{self.make} {self.model}"
 
+    def save(self, *args, **kwargs):
+        self.normalized_make = normalize_text(self.make)
+        self.normalized_model = normalize_text(self.model)
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse("carmodel_detail", kwargs={"pk": self.pk})
 
 
-class Car(models.Model):
+class CarQuerySet(models.QuerySet):
+    # what a car list row shows and keys its cached fragment on, the note HTML stays behind
+    LIST_FIELDS = (
+        "id", "car_img", "car_img_hash", "note_excerpt", "customer_id",
+        "car_model", "car_model__make", "car_model__model",
+    )
+
+    def for_list(self):
+        return self.select_related("car_model").only(*self.LIST_FIELDS)
+
+
+class Car(RenditionsMixin, models.Model):
     plate_number = models.CharField(_("plate number"), max_length=50)
     vin_code = models.CharField(_("vin code"), max_length=100)
     note = HTMLField(_("note"), max_length=4000, null=True, blank=True)
+    # allowlisted copy of note and its plain text start, filled by save()
+    note_html = models.TextField(editable=False, blank=True, default="")
+    note_excerpt = models.CharField(max_length=255, editable=False, blank=True, default="")
     car_model = models.ForeignKey(
         CarModel,
         verbose_name=_("car model"),
@@ -43,6 +95,7 @@ class Car(models.Model):
         null=True,
         blank=True,
     )
+    car_img_hash = models.CharField(max_length=64, editable=False, blank=True, default="")
     customer = models.ForeignKey(
         User,
         verbose_name=_("customer"),
@@ -51,6 +104,13 @@ class Car(models.Model):
         null=True,
         blank=True
     )
+    normalized_plate = models.CharField(max_length=50, editable=False, db_index=True, default="")
+    normalized_vin = models.CharField(max_length=100, editable=False, db_index=True, default="")
+    updated_at = models.DateTimeField(_("updated"), auto_now=True)
+
+    rendition_fields = {"car_img": "car_img_hash"}
+
+    objects = CarQuerySet.as_manager()
 
     class Meta:
         ordering = ["car_model"]
@@ -60,12 +120,125 @@ class Car(models.Model):
     def __str__(self):
         return f"{self.plate_number} {self.vin_code} {self.customer} {self.car_model}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_customer_id = instance.__dict__.get("customer_id")
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.normalized_plate = normalize_code(self.plate_number)
+        self.normalized_vin = normalize_code(self.vin_code)
+        if "note" in self.__dict__:
+            self.note_html, self.note_excerpt = clean_html(self.note)
+        owner_changed = (
+            not self._state.adding and "customer_id" in self.__dict__
+            and self.__dict__.get("_saved_customer_id", "unknown") != self.customer_id
+        )
+        super().save(*args, **kwargs)
+        if owner_changed:
+            # orders follow the car to its new owner
+            self.orders.update(customer_id=self.customer_id, updated_at=timezone.now())
+        self._saved_customer_id = self.customer_id
+
     def get_absolute_url(self):
         return reverse("car_detail", kwargs={"pk": self.pk})
 
 
+class OrderQuerySet(models.QuerySet):
+    # what order list rows show, str(order) included, and their fragment keys
+    LIST_FIELDS = (
+        "id", "date", "order_sum", "status", "due_back", "customer_id",
+        "car", "car__plate_number", "car__vin_code",
+        "car__car_model", "car__car_model__make", "car__car_model__model",
+        "car__customer", "car__customer__username",
+    )
+
+    def for_list(self):
+        return self.select_related("car__car_model", "car__customer").only(*self.LIST_FIELDS)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        customers = dict(
+            Car.objects.filter(pk__in={order.car_id for order in objs}).values_list("pk", "customer_id")
+        )
+        for order in objs:
+            order.customer_id = customers.get(order.car_id)
+        created = super().bulk_create(objs, *args, **kwargs)
+        ReportDay.objects.mark(order.date for order in created)
+        return created
+
+    def overdue(self, today=None):
+        """Open orders past their due_back date, served by the partial order_overdue_idx."""
+        # statuses as literals, SQLite matches a partial index only against constants;
+        # the column goes through F() so a subquery's table alias is used
+        is_open = models.Func(
+            models.F("status"),
+            template="%%(expressions)s IN (%s)" % ", ".join(str(status) for status in OPEN_STATUSES),
+            output_field=models.BooleanField(),
+        )
+        return self.filter(is_open, due_back__lt=today or date.today())
+
+    def mark_report_days(self):
+        """Queue the dates of these orders for the next reports.refresh()."""
+        ReportDay.objects.mark(self.order_by().values_list("date", flat=True).distinct())
+
+    def apply_sum_deltas(self, deltas):
+        """Shift order_sum of each order id in ``deltas`` by its amount in the database.
+
+        Every order in ``deltas`` is touched, a zero delta still means one of
+        its entries changed and the order page with it.
+        """
+        changed = [order_id for order_id in deltas if order_id is not None]
+        now = timezone.now()
+        for order_id in changed:
+            if deltas[order_id]:
+                self.filter(pk=order_id).update(order_sum=models.F("order_sum") + deltas[order_id], updated_at=now)
+        unchanged_sums = [order_id for order_id in changed if not deltas[order_id]]
+        if unchanged_sums:
+            self.filter(pk__in=unchanged_sums).update(updated_at=now)
+        versions.bump(Order._meta.label, changed)
+
+    def with_entries_sum(self):
+        entries_sum = (
+            OrderEntry.objects.filter(order=models.OuterRef("pk"))
+            .order_by()
+            .values("order")
+            .annotate(total_sum=models.Sum("total"))
+            .values("total_sum")
+        )
+        output_field = models.DecimalField(max_digits=18, decimal_places=2)
+        return self.annotate(entries_sum=Coalesce(
+            models.Subquery(entries_sum, output_field=output_field),
+            models.Value(Decimal(0), output_field=output_field),
+            output_field=output_field,
+        ))
+
+    def recompute_sums(self, batch_size=1000, dry_run=False):
+        """Rewrite order_sum of drifted orders from their entries, returns the number of drifted orders."""
+        drifted_count = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                self.filter(pk__gt=last_pk).order_by("pk")
+                .with_entries_sum().only("pk", "order_sum", "date")[:batch_size]
+            )
+            if not batch:
+                return drifted_count
+            last_pk = batch[-1].pk
+            drifted = [order for order in batch if order.order_sum != order.entries_sum]
+            drifted_count += len(drifted)
+            if drifted and not dry_run:
+                for order in drifted:
+                    order.order_sum = order.entries_sum
+                    order.updated_at = timezone.now()
+                Order.objects.bulk_update(drifted, ["order_sum", "updated_at"])
+                versions.bump(Order._meta.label, [order.pk for order in drifted])
+                ReportDay.objects.mark(order.date for order in drifted)
+
+
 class Order(models.Model):
-    date = models.DateField(_("date"), auto_now=False, auto_now_add=True)
+    date = models.DateField(_("date"), auto_now=False, auto_now_add=True, db_index=True)
     order_sum = models.DecimalField(_("order sum"), max_digits=18, decimal_places=2, default=0)
     car = models.ForeignKey(
         Car,
@@ -91,25 +264,67 @@ class Order(models.Model):
     )
 
     due_back = models.DateField(_("due back"), null=True, blank=True, db_index=True)
+    # copy of car.customer, kept in sync by Order.save() and Car.save()
+    customer = models.ForeignKey(
+        User,
+        verbose_name=_("customer"),
+        on_delete=models.SET_NULL,
+        related_name="orders",
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=False,
+    )
+    # also moved by writes to the order's entries and comments, see OrderDetailView
+    updated_at = models.DateTimeField(_("updated"), auto_now=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # compared on save to notify the customer of status changes
+        instance._saved_status = instance.__dict__.get("status")
+        return instance
 
     @property
     def is_overdue(self):
-        if self.due_back and date.today() > self.due_back:
+        if self.status in OPEN_STATUSES and self.due_back and date.today() > self.due_back:
             return True
         return False
 
-    @property
-    def customer(self):
-        return self.car.customer
-
     class Meta:
         ordering = ["date", "id"]
+        indexes = [
+            models.Index(fields=["status", "date"], name="order_status_date_idx"),
+            models.Index(fields=["customer", "date"], name="order_customer_date_idx"),
+            models.Index(
+                fields=["due_back"],
+                condition=models.Q(status__in=OPEN_STATUSES),
+                name="order_overdue_idx",
+            ),
+        ]
         verbose_name = _("order")
         verbose_name_plural = _("orders")
 
     def __str__(self):
         return f"{self.date} {self.order_sum} {self.car}"
 
+    def save(self, *args, **kwargs):
+        if Order.car.is_cached(self):
+            self.customer_id = self.car.customer_id
+        else:
+            self.customer_id = Car.objects.filter(pk=self.car_id).values_list("customer_id", flat=True).first()
+        if not self._state.adding and not args and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            # order_sum moves with F() deltas as entries change, the copy loaded with
+            # this instance may be stale; it is only written when listed in update_fields
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "order_sum" and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse("order_detail", kwargs={"pk": self.pk})
 
@@ -130,6 +345,75 @@ class Service(models.Model):
         return reverse("service_detail", kwargs={"pk": self.pk})
 
 
+class OrderEntryQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for entry in objs:
+            entry.total = entry.price * entry.quantity
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            order_ids = {entry.order_id for entry in objs}
+            if kwargs.get("ignore_conflicts") or kwargs.get("update_conflicts"):
+                # skipped or overwritten rows make the deltas unknown
+                Order.objects.filter(pk__in=order_ids).recompute_sums()
+            else:
+                deltas = defaultdict(Decimal)
+                for entry in objs:
+                    deltas[entry.order_id] += entry.total
+                Order.objects.apply_sum_deltas(deltas)
+            if all(OrderEntry.order.is_cached(entry) for entry in objs):
+                ReportDay.objects.mark(entry.order.date for entry in objs)
+            else:
+                Order.objects.filter(pk__in=order_ids).mark_report_days()
+        # bulk_create() sends no post_save signals
+        if kwargs.get("ignore_conflicts") or kwargs.get("update_conflicts"):
+            counters.invalidate(OrderEntry)
+        else:
+            counters.adjust(OrderEntry, len(created))
+        return created
+
+    def update(self, **kwargs):
+        kwargs.setdefault("updated_at", timezone.now())
+        moves_order = "order" in kwargs or "order_id" in kwargs
+        with transaction.atomic(using=self.db):
+            if moves_order:
+                entry_pks, order_ids = set(), set()
+                for pk, order_id in self.order_by().values_list("pk", "order_id"):
+                    entry_pks.add(pk)
+                    order_ids.add(order_id)
+            else:
+                order_ids = set(self.order_by().values_list("order_id", flat=True).distinct())
+            rows = super().update(**kwargs)
+            if moves_order:
+                order_ids.update(OrderEntry.objects.filter(pk__in=entry_pks).values_list("order_id", flat=True))
+            if "price" in kwargs or "quantity" in kwargs:
+                models.QuerySet(OrderEntry, using=self.db).filter(order_id__in=order_ids).update(
+                    total=models.F("price") * models.F("quantity")
+                )
+            Order.objects.filter(pk__in=order_ids).recompute_sums()
+            Order.objects.filter(pk__in=order_ids).update(updated_at=kwargs["updated_at"])
+            Order.objects.filter(pk__in=order_ids).mark_report_days()
+        return rows
+    update.alters_data = True
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            deltas = {
+                row["order_id"]: -row["total_sum"]
+                for row in self.order_by().values("order_id").annotate(total_sum=models.Sum("total"))
+            }
+            token = bulk_entry_delete.set(True)
+            try:
+                result = super().delete()
+            finally:
+                bulk_entry_delete.reset(token)
+            Order.objects.apply_sum_deltas(deltas)
+            Order.objects.filter(pk__in=deltas).mark_report_days()
+        return result
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class OrderEntry(models.Model):
     quantity = models.DecimalField(_("quantity"), max_digits=18, decimal_places=2, default=1)
     price = models.DecimalField(_("price"), max_digits=18, decimal_places=2, default=0)
@@ -146,6 +430,9 @@ class OrderEntry(models.Model):
         on_delete=models.CASCADE,
         related_name="order_entries",
     )
+    updated_at = models.DateTimeField(_("updated"), auto_now=True)
+
+    objects = OrderEntryQuerySet.as_manager()
 
     class Meta:
         ordering = ["service"]
@@ -162,9 +449,22 @@ class OrderEntry(models.Model):
         if self.price == 0:
             self.price = self.service.price
         self.total = self.price * self.quantity
-        super().save(*args, **kwargs)
-        self.order.order_sum = self.order.order_entries.aggregate(models.Sum("total"))["total__sum"]
-        self.order.save()
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = (
+                    OrderEntry.objects.select_for_update().order_by()
+                    .filter(pk=self.pk).values("order_id", "total").first()
+                )
+            super().save(*args, **kwargs)
+            deltas = defaultdict(Decimal)
+            deltas[self.order_id] += self.total
+            if previous:
+                deltas[previous["order_id"]] -= previous["total"]
+            Order.objects.apply_sum_deltas(deltas)
+            Order.objects.filter(pk__in=deltas).mark_report_days()
+        if OrderEntry.order.is_cached(self):
+            self.order.order_sum += deltas[self.order_id]
 
 
 class OrderComment(models.Model):
@@ -182,6 +482,7 @@ class OrderComment(models.Model):
         )
     created_at = models.DateTimeField(_("Created"), auto_now_add=True)
     content = models.TextField(_("content"), max_length=4000)    
+    updated_at = models.DateTimeField(_("updated"), auto_now=True)
 
     class Meta:
         ordering=['-created_at']
@@ -193,3 +494,120 @@ class OrderComment(models.Model):
 
     def get_absolute_url(self):
         return reverse("ordercomment_detail", kwargs={"pk": self.pk})
+
+
+class ReportDayQuerySet(models.QuerySet):
+    def mark(self, days):
+        days = {day for day in days if day}
+        if days:
+            self.bulk_create([ReportDay(day=day) for day in days], ignore_conflicts=True)
+
+
+class ReportDay(models.Model):
+    """Order date whose rollup rows are out of date, see reports.refresh()."""
+    day = models.DateField(_("day"), unique=True)
+
+    objects = ReportDayQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("report day")
+        verbose_name_plural = _("report days")
+
+    def __str__(self):
+        return str(self.day)
+
+
+class RevenueRollup(models.Model):
+    """Entry totals of one day, service and car make, rebuilt by reports.refresh()."""
+    day = models.DateField(_("day"))
+    service = models.ForeignKey(
+        Service,
+        verbose_name=_("service"),
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    make = models.CharField(_("make"), max_length=100)
+    entries = models.PositiveIntegerField(_("entries"), default=0)
+    quantity = models.DecimalField(_("quantity"), max_digits=18, decimal_places=2, default=0)
+    revenue = models.DecimalField(_("revenue"), max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["day"]
+        constraints = [
+            models.UniqueConstraint(fields=["day", "service", "make"], name="revenue_rollup_unique"),
+        ]
+        verbose_name = _("revenue rollup")
+        verbose_name_plural = _("revenue rollups")
+
+    def __str__(self):
+        return f"{self.day} {self.service_id} {self.make} {self.revenue}"
+
+
+class OrderStatusRollup(models.Model):
+    """Number and sum of orders of one day in one status, rebuilt by reports.refresh()."""
+    day = models.DateField(_("day"))
+    status = models.PositiveBigIntegerField(_("status"), choices=Order.STATUS_CHOICES)
+    orders = models.PositiveIntegerField(_("orders"), default=0)
+    order_sum = models.DecimalField(_("order sum"), max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["day", "status"]
+        constraints = [
+            models.UniqueConstraint(fields=["day", "status"], name="order_status_rollup_unique"),
+        ]
+        verbose_name = _("order status rollup")
+        verbose_name_plural = _("order status rollups")
+
+    def __str__(self):
+        return f"{self.day} {self.get_status_display()} {self.orders}"
+
+
+class OutboxEmailQuerySet(models.QuerySet):
+    def pending(self, now=None):
+        """Unsent emails due by ``now`` with attempts left, oldest first."""
+        return self.filter(
+            sent_at__isnull=True,
+            attempts__lt=settings.OUTBOX_MAX_ATTEMPTS,
+            send_after__lte=now or timezone.now(),
+        ).order_by("send_after", "id")
+
+
+class OutboxEmail(models.Model):
+    """Email waiting for the send_outbox worker, queued by autoservisas.notifications."""
+    key = models.CharField(_("key"), max_length=200, unique=True)
+    to = models.EmailField(_("to"))
+    subject = models.CharField(_("subject"), max_length=255)
+    body = models.TextField(_("body"))
+    created_at = models.DateTimeField(_("created"), auto_now_add=True)
+    send_after = models.DateTimeField(_("send after"), default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(_("attempts"), default=0)
+    last_error = models.TextField(_("last error"), blank=True, default="")
+    sent_at = models.DateTimeField(_("sent"), null=True, blank=True)
+
+    objects = OutboxEmailQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["send_after", "id"]
+        indexes = [
+            models.Index(fields=["send_after"], condition=models.Q(sent_at__isnull=True), name="outbox_pending_idx"),
+        ]
+        verbose_name = _("outbox email")
+        verbose_name_plural = _("outbox emails")
+
+    def __str__(self):
+        return f"{self.key} {self.to}"
+
+
+class OrderStatusEvent(models.Model):
+    """Status change written with the order for events.PollingBroker, the ids order the changes of all processes."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="status_events")
+    status = models.PositiveBigIntegerField(_("status"), choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField(_("created"), auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["id"]
+        verbose_name = _("order status event")
+        verbose_name_plural = _("order status events")
+
+    def __str__(self):
+        return f"{self.order_id} {self.get_status_display()}"
@@ -0,0 +1,127 @@
+"""Customer emails, queued in the OutboxEmail table in the same transaction as
+the change they report and sent later by the send_outbox worker.
+
+Every email has a key naming the event, an event queued twice is sent once.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
+from . models import Order, OrderComment, OutboxEmail
+
+
+def queue(emails) -> None:
+    """Queue ``(key, to, subject, body)`` tuples, keys already queued are skipped."""
+    OutboxEmail.objects.bulk_create(
+        [OutboxEmail(key=key, to=to, subject=subject, body=body) for key, to, subject, body in emails],
+        ignore_conflicts=True,
+    )
+
+
+def order_email(order: Order, key: str, subject: str, body: str):
+    """Email tuple to the customer of ``order``, None if there is nobody to write to."""
+    customer = order.customer
+    if customer is None or not customer.email:
+        return None
+    greeting = _('Hello %(name)s,') % {'name': customer.get_full_name() or customer.get_username()}
+    return key, customer.email, subject, f'{greeting}\n\n{body}\n'
+
+
+def status_email(order: Order):
+    return order_email(
+        order,
+        # the change time tells a later return to the same status from a repeat of this change
+        f'order-{order.pk}-status-{order.status}-{order.updated_at:%Y%m%d%H%M%S%f}',
+        _('Your order #%(id)d is now: %(status)s') % {'id': order.pk, 'status': order.get_status_display()},
+        _('the status of the order for your car %(plate)s changed to "%(status)s".') % {
+            'plate': order.car.plate_number, 'status': order.get_status_display(),
+        },
+    )
+
+
+def comment_email(comment: OrderComment):
+    return order_email(
+        comment.order,
+        f'comment-{comment.pk}',
+        _('New comment on your order #%(id)d') % {'id': comment.order_id},
+        _('%(commenter)s wrote:\n\n%(content)s') % {'commenter': comment.commenter or _('Car Service'), 'content': comment.content},
+    )
+
+
+def overdue_email(order: Order):
+    # one apology per due date, daily sweeps do not repeat it
+    return order_email(
+        order,
+        f'order-{order.pk}-overdue-{order.due_back}',
+        _('Your order #%(id)d is running late') % {'id': order.pk},
+        _('your car %(plate)s was due back on %(due_back)s. '
+          'We are still working on it and will let you know as soon as it is ready.') % {
+            'plate': order.car.plate_number, 'due_back': order.due_back,
+        },
+    )
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=settings.OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1))
+
+
+def claim(batch_size: int) -> list[OutboxEmail]:
+    """Lease a batch of due emails to this worker, counting the attempt up front.
+
+    The rows are locked only while the lease is written, a worker that dies
+    before recording the result leaves them to be retried once it runs out.
+    """
+    with transaction.atomic():
+        # workers running side by side skip each other's rows
+        batch = list(OutboxEmail.objects.pending().select_for_update(skip_locked=True)[:batch_size])
+        lease_until = timezone.now() + timedelta(seconds=settings.OUTBOX_CLAIM_SECONDS)
+        for email in batch:
+            email.attempts += 1
+            email.send_after = lease_until
+        OutboxEmail.objects.bulk_update(batch, ['attempts', 'send_after'])
+    return batch
+
+
+def fail(email: OutboxEmail, error: Exception) -> None:
+    email.last_error = str(error)
+    email.send_after = timezone.now() + retry_delay(email.attempts)
+
+
+def send_pending(batch_size: int | None = None) -> tuple[int, int]:
+    """Send the due outbox emails over one mail connection, returns sent and failed counts.
+
+    The connection is opened once there is something to send. When the mail
+    server cannot be reached the claimed batch is rescheduled like any failed
+    email and the run stops there.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    sent = failed = 0
+    connection = None
+    try:
+        while batch := claim(batch_size):
+            # no transaction or row lock is held while talking to the mail server
+            try:
+                connection = connection or get_connection()
+                connection.open()
+            except Exception as error:
+                for email in batch:
+                    fail(email, error)
+                OutboxEmail.objects.bulk_update(batch, ['last_error', 'send_after'])
+                return sent, failed + len(batch)
+            for email in batch:
+                try:
+                    EmailMessage(email.subject, email.body, to=[email.to], connection=connection).send()
+                except Exception as error:
+                    # one bad address or a dropped connection must not stop the batch
+                    fail(email, error)
+                    failed += 1
+                else:
+                    email.sent_at = timezone.now()
+                    sent += 1
+            OutboxEmail.objects.bulk_update(batch, ['last_error', 'send_after', 'sent_at'])
+    finally:
+        if connection is not None:
+            connection.close()
+    return sent, failed
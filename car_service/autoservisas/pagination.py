@@ -0,0 +1,163 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q, QuerySet
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def estimate_count(queryset: QuerySet) -> int | None:
+    """Row estimate from the query planner, ``None`` where the backend has none."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = queryset.explain(format='json')
+    return int(json.loads(plan)[0]['Plan']['Plan Rows'])
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, estimated_total=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.estimated_total = estimated_total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+    @property
+    def last_cursor(self) -> str:
+        return PREVIOUS
+
+
+class CursorPaginator:
+    """Keyset pagination over ``ordering``, which must end with a unique field.
+
+    Pages are found with a ``WHERE (a, b) > (x, y)`` style filter instead of
+    OFFSET, so deep pages cost as much as the first one and no COUNT is run.
+    Cursors look like ``n.<key>`` (rows after key) or ``p.<key>`` (rows before
+    key), a bare ``p`` being the last page. Ordering may follow foreign keys,
+    ``car_model__make``, the rows then need that relation loaded.
+    """
+
+    def __init__(self, queryset: QuerySet, per_page: int, ordering, estimate_total: bool = False):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.paths = [name.split('__') for name in ordering]
+        self.fields = [self.resolve(queryset.model, path) for path in self.paths]
+        # what filters and ORDER BY use, a foreign key by its own column
+        self.lookups = ['__'.join(path[:-1] + [field.attname]) for path, field in zip(self.paths, self.fields)]
+        self.estimate_total = estimate_total
+
+    @staticmethod
+    def resolve(model, path: list[str]):
+        for name in path[:-1]:
+            model = model._meta.get_field(name).related_model
+        return model._meta.get_field(path[-1])
+
+    def encode(self, direction: str, obj) -> str:
+        key = []
+        for path, field in zip(self.paths, self.fields):
+            owner = obj
+            for name in path[:-1]:
+                owner = getattr(owner, name)
+            key.append(field.value_to_string(owner))
+        token = urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+        return f'{direction}.{token}'
+
+    def decode(self, cursor: str | None):
+        """Return ``(direction, key values)``, an invalid cursor means the first page."""
+        if not cursor:
+            return NEXT, None
+        direction, _, token = cursor.partition('.')
+        if direction not in (NEXT, PREVIOUS):
+            return NEXT, None
+        if not token:
+            return direction, None
+        try:
+            key = json.loads(urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            if len(key) != len(self.fields):
+                raise ValueError(key)
+            return direction, [field.to_python(value) for field, value in zip(self.fields, key)]
+        except (BinasciiError, ValueError, TypeError, ValidationError):
+            return NEXT, None
+
+    def beyond(self, values, lookup: str) -> Q:
+        condition = Q()
+        for position, name in enumerate(self.lookups):
+            equal = dict(zip(self.lookups[:position], values))
+            condition |= Q(**equal, **{f'{name}__{lookup}': values[position]})
+        return condition
+
+    def page_queryset(self, direction: str, values) -> QuerySet:
+        """Rows of the page plus one, the extra row tells whether there are more."""
+        names = self.lookups
+        if direction == NEXT:
+            qs = self.queryset.order_by(*names)
+            if values is not None:
+                qs = qs.filter(self.beyond(values, 'gt'))
+        else:
+            qs = self.queryset.order_by(*[f'-{name}' for name in names])
+            if values is not None:
+                qs = qs.filter(self.beyond(values, 'lt'))
+        return qs[:self.per_page + 1]
+
+    def get_page(self, cursor: str | None) -> CursorPage:
+        direction, values = self.decode(cursor)
+        rows = list(self.page_queryset(direction, values))
+        estimated_total = estimate_count(self.queryset) if self.estimate_total else None
+        return self.make_page(direction, values, rows, estimated_total)
+
+    async def aget_page(self, cursor: str | None) -> CursorPage:
+        direction, values = self.decode(cursor)
+        rows = [row async for row in self.page_queryset(direction, values)]
+        estimated_total = await sync_to_async(estimate_count)(self.queryset) if self.estimate_total else None
+        return self.make_page(direction, values, rows, estimated_total)
+
+    def make_page(self, direction: str, values, rows: list, estimated_total: int | None) -> CursorPage:
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == NEXT:
+            has_next, has_previous = has_more, values is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = values is not None, has_more
+        return CursorPage(
+            rows,
+            next_cursor=self.encode(NEXT, rows[-1]) if rows and has_next else None,
+            previous_cursor=self.encode(PREVIOUS, rows[0]) if rows and has_previous else None,
+            estimated_total=estimated_total,
+        )
+
+
+class CursorPaginationMixin:
+    """Keyset pagination for ListView, keyed on ``cursor_ordering`` or the model ordering."""
+    cursor_ordering = None
+    estimate_total = False
+
+    def get_cursor_paginator(self, queryset, page_size) -> CursorPaginator:
+        ordering = self.cursor_ordering or queryset.model._meta.ordering
+        return CursorPaginator(queryset, page_size, ordering, estimate_total=self.estimate_total)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_cursor_paginator(queryset, page_size)
+        page = paginator.get_page(self.request.GET.get('cursor'))
+        return paginator, page, page.object_list, page.has_other_pages()
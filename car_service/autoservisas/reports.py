@@ -0,0 +1,104 @@
+from datetime import date
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from . models import Order, OrderEntry, OrderStatusRollup, ReportDay, RevenueRollup
+
+# canceled orders bring no revenue
+EXCLUDED_STATUSES = (5,)
+DAYS_PER_BATCH = 100
+DAYS_SHOWN = 31
+
+
+def revenue_rows(days):
+    """Live entry totals of ``days`` grouped the way RevenueRollup stores them."""
+    return (
+        OrderEntry.objects.filter(order__date__in=days)
+        .exclude(order__status__in=EXCLUDED_STATUSES)
+        .order_by()
+        .values("order__date", "service_id", "order__car__car_model__make")
+        .annotate(entries=Count("pk"), quantity=Sum("quantity"), revenue=Sum("total"))
+    )
+
+
+def status_rows(days):
+    return (
+        Order.objects.filter(date__in=days)
+        .order_by()
+        .values("date", "status")
+        .annotate(orders=Count("pk"), order_sum=Sum("order_sum"))
+    )
+
+
+def refresh_days(days) -> None:
+    """Replace the rollup rows of ``days`` with fresh aggregates of the live tables."""
+    days = list(days)
+    with transaction.atomic():
+        RevenueRollup.objects.filter(day__in=days).delete()
+        OrderStatusRollup.objects.filter(day__in=days).delete()
+        RevenueRollup.objects.bulk_create(
+            RevenueRollup(
+                day=row["order__date"],
+                service_id=row["service_id"],
+                make=row["order__car__car_model__make"],
+                entries=row["entries"],
+                quantity=row["quantity"],
+                revenue=row["revenue"],
+            ) for row in revenue_rows(days)
+        )
+        OrderStatusRollup.objects.bulk_create(
+            OrderStatusRollup(day=row["date"], status=row["status"], orders=row["orders"], order_sum=row["order_sum"])
+            for row in status_rows(days)
+        )
+
+
+def refresh(batch_size: int = DAYS_PER_BATCH) -> int:
+    """Recompute the days queued in ReportDay, returns the number of days refreshed."""
+    refreshed = 0
+    while True:
+        with transaction.atomic():
+            days = list(ReportDay.objects.order_by("day").values_list("day", flat=True)[:batch_size])
+            if not days:
+                return refreshed
+            # dequeue first, a write landing meanwhile queues its day again
+            ReportDay.objects.filter(day__in=days).delete()
+            refresh_days(days)
+        refreshed += len(days)
+
+
+def rebuild(batch_size: int = DAYS_PER_BATCH) -> int:
+    """Recompute every rollup row from scratch, returns the number of days with orders.
+
+    One transaction, the report keeps showing the old totals until the new ones are complete.
+    """
+    with transaction.atomic():
+        ReportDay.objects.all().delete()
+        RevenueRollup.objects.all().delete()
+        OrderStatusRollup.objects.all().delete()
+        days = list(Order.objects.order_by("date").values_list("date", flat=True).distinct())
+        for start in range(0, len(days), batch_size):
+            refresh_days(days[start:start + batch_size])
+    return len(days)
+
+
+def summary(start: date | None = None, end: date | None = None) -> dict:
+    """Report tables for the half-open ``[start, end)`` range, read from the rollups only."""
+    revenue = RevenueRollup.objects.order_by()
+    statuses = OrderStatusRollup.objects.order_by()
+    if start:
+        revenue, statuses = revenue.filter(day__gte=start), statuses.filter(day__gte=start)
+    if end:
+        revenue, statuses = revenue.filter(day__lt=end), statuses.filter(day__lt=end)
+    status_labels = dict(Order.STATUS_CHOICES)
+    by_status = statuses.values("status").annotate(orders=Sum("orders"), order_sum=Sum("order_sum")).order_by("status")
+    return {
+        "total": revenue.aggregate(revenue=Sum("revenue"), entries=Sum("entries")),
+        "by_day": revenue.values("day").annotate(revenue=Sum("revenue")).order_by("-day")[:DAYS_SHOWN],
+        "by_month": revenue.annotate(month=TruncMonth("day")).values("month").annotate(revenue=Sum("revenue")).order_by("-month"),
+        "by_service": revenue.values("service_id", "service__name").annotate(
+            quantity=Sum("quantity"), revenue=Sum("revenue"),
+        ).order_by("-revenue"),
+        "by_make": revenue.values("make").annotate(revenue=Sum("revenue")).order_by("-revenue"),
+        "by_status": [dict(row, label=status_labels.get(row["status"])) for row in by_status],
+        "pending_days": ReportDay.objects.count(),
+    }
@@ -0,0 +1,110 @@
+"""Allowlist HTML cleaning for rich text written in TinyMCE.
+
+Runs once when the text is saved, templates render the stored result as is.
+"""
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+from django.utils.text import Truncator
+
+ALLOWED_TAGS = {
+    'a', 'b', 'blockquote', 'br', 'code', 'em', 'h2', 'h3', 'h4', 'hr', 'i', 'li', 'ol', 'p', 'pre',
+    's', 'span', 'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'th', 'thead', 'tr', 'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan'},
+}
+ALLOWED_URL_SCHEMES = {'', 'http', 'https', 'mailto', 'tel'}
+VOID_TAGS = {'br', 'hr'}
+# dropped together with everything inside them
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'textarea', 'select'}
+# a new one of these closes the previous one left open, as browsers do
+SELF_CLOSING_TAGS = {'li', 'p', 'td', 'th', 'tr'}
+BLOCK_TAGS = {'blockquote', 'br', 'h2', 'h3', 'h4', 'hr', 'li', 'p', 'pre', 'td', 'th', 'tr'}
+EXCERPT_LENGTH = 200
+
+
+def allowed_url(url: str) -> bool:
+    # browsers ignore control characters and whitespace inside the scheme
+    compact = ''.join(character for character in url if character.isprintable() and not character.isspace())
+    try:
+        return urlsplit(compact).scheme.lower() in ALLOWED_URL_SCHEMES
+    except ValueError:
+        return False
+
+
+class Cleaner(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in ALLOWED_TAGS:
+            return
+        if tag in SELF_CLOSING_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        kept = ''.join(
+            f' {name}="{escape(value, quote=True)}"' for name, value in attrs
+            if name in allowed and value is not None and (name != 'href' or allowed_url(value))
+        )
+        if tag == 'a' and 'href=' in kept:
+            kept += ' rel="nofollow noopener"'
+        self.html.append(f'<{tag}{kept}>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            return
+        self.handle_starttag(tag, attrs)
+        if tag in self.open_tags and tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in self.open_tags:
+            return
+        # close whatever was left open inside this tag
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.html.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.html.append(escape(data, quote=False))
+            self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.html.append(f'</{self.open_tags.pop()}>')
+
+
+def clean_html(value: str | None) -> tuple[str, str]:
+    """Allowlisted HTML of ``value`` and a plain text excerpt of it."""
+    cleaner = Cleaner()
+    cleaner.feed(value or '')
+    cleaner.close()
+    text = ' '.join(''.join(cleaner.text).split())
+    return ''.join(cleaner.html), Truncator(text).chars(EXCERPT_LENGTH)
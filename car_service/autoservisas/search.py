@@ -0,0 +1,125 @@
+import re
+from datetime import date, timedelta
+from django.db.models import Q, QuerySet
+from user_profile.models import Profile
+from . models import CarModel, Car, normalize_code, normalize_text
+
+VIN_LENGTH = 17
+PLATE_MAX_LENGTH = 8
+CODE_RE = re.compile(r'^[A-Z0-9]+$')
+DATE_RE = re.compile(r'^(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?$')
+DATE_RANGE_SEPARATOR = '..'
+
+# upper bound for prefix ranges, sorts after anything a normalized column holds
+PREFIX_END = '\U0010ffff'
+
+
+def prefix_q(field: str, prefix: str) -> Q:
+    """Prefix match as a range, so a plain B-tree index serves it on every backend."""
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + PREFIX_END})
+
+
+def query_shape(query: str) -> str:
+    """Tell whether a search query looks like a ``vin``, a ``plate`` or free ``text``."""
+    code = normalize_code(query)
+    if not CODE_RE.match(code):
+        return 'text'
+    if len(code) <= PLATE_MAX_LENGTH:
+        # plates are often typed with a space, "ABC 123"
+        return 'plate'
+    if len(query.split()) == 1:
+        return 'vin'
+    return 'text'
+
+
+def matching_car_model_ids(text: str) -> list[int]:
+    """Ids of car models matching every word of ``text``.
+
+    The first word must start the make or the model, which the indexes serve,
+    the rest only narrow those rows down and may appear anywhere.
+    """
+    first, *rest = normalize_text(text).split() or ['']
+    qs = CarModel.objects.order_by().filter(
+        prefix_q('normalized_make', first) | prefix_q('normalized_model', first)
+    )
+    for word in rest:
+        qs = qs.filter(Q(normalized_make__contains=word) | Q(normalized_model__contains=word))
+    return list(qs.values_list('pk', flat=True))
+
+
+def search_cars(qs: QuerySet, query: str) -> QuerySet:
+    """Filter cars by ``query`` using the cheapest indexed lookup for its shape.
+
+    A VIN is looked up exactly once it is complete and by prefix before that,
+    a plate-like token matches plate prefixes and car models, anything else
+    matches car models only. Car models are resolved first against the small
+    catalogue, so the car table is never joined for the text match.
+    """
+    shape = query_shape(query)
+    if shape == 'vin':
+        code = normalize_code(query)
+        if len(code) == VIN_LENGTH:
+            return qs.filter(normalized_vin=code)
+        return qs.filter(prefix_q('normalized_vin', code))
+    car_model_q = Q(car_model_id__in=matching_car_model_ids(query))
+    if shape == 'plate':
+        return qs.filter(prefix_q('normalized_plate', normalize_code(query)) | car_model_q)
+    return qs.filter(car_model_q)
+
+
+def parse_date_range(text: str) -> tuple[date, date] | None:
+    """Turn ``2023``, ``2023-06`` or ``2023-06-07`` into a half-open ``[start, end)`` range."""
+    match = DATE_RE.match(text.strip())
+    if not match:
+        return None
+    year, month, day = (int(part) if part else None for part in match.groups())
+    try:
+        if day:
+            start = date(year, month, day)
+            return start, start + timedelta(days=1)
+        if month:
+            start = date(year, month, 1)
+            return start, date(year + month // 12, month % 12 + 1, 1)
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    except ValueError:
+        return None
+
+
+def parse_dates(query: str) -> tuple[date, date] | None:
+    """Date or ``from..to`` date range in ``query``, either side of a range may be partial."""
+    if DATE_RANGE_SEPARATOR in query:
+        first, _, last = query.partition(DATE_RANGE_SEPARATOR)
+        first, last = parse_date_range(first), parse_date_range(last)
+        if first and last:
+            return first[0], last[1]
+        return None
+    return parse_date_range(query)
+
+
+def matching_user_ids(text: str) -> QuerySet:
+    """Subquery of the users whose username, first or last name starts with each word of ``text``.
+
+    Names are compared against the indexed copies on ``Profile``, upper-cased
+    in Python the way ``text`` is, so "šarūnas" finds "Šarūnas" on every backend.
+    It stays a subquery, a common name can match more users than a query may bind.
+    """
+    qs = Profile.objects.order_by().filter(user__isnull=False)
+    for word in normalize_text(text).split():
+        qs = qs.filter(
+            prefix_q('normalized_username', word) |
+            prefix_q('normalized_first_name', word) |
+            prefix_q('normalized_last_name', word)
+        )
+    return qs.values('user_id')
+
+
+def search_orders(qs: QuerySet, query: str) -> QuerySet:
+    """Filter orders by a date, a date range, a plate number or a customer name."""
+    dates = parse_dates(query)
+    if dates:
+        return qs.filter(date__gte=dates[0], date__lt=dates[1])
+    customer_q = Q(customer_id__in=matching_user_ids(query))
+    if query_shape(query) == 'plate':
+        plate_cars = Car.objects.order_by().filter(prefix_q('normalized_plate', normalize_code(query)))
+        return qs.filter(Q(car__in=plate_cars.values('pk')) | customer_q)
+    return qs.filter(customer_q)
@@ -0,0 +1,32 @@
+from decimal import Decimal
+from . models import Order, Service, OrderEntry
+
+
+def add_entries(order: Order, lines) -> list[OrderEntry]:
+    """Add many entries to ``order`` with a single price lookup, insert and order_sum update.
+
+    ``lines`` holds ``(service_id, quantity)`` or ``(service_id, quantity, price)`` tuples,
+    an empty or zero price falls back to the service price just like ``OrderEntry.save()``.
+    """
+    lines = [tuple(line) for line in lines]
+    if not lines:
+        return []
+    missing_price_ids = {line[0] for line in lines if len(line) < 3 or not line[2]}
+    prices = dict(
+        Service.objects.filter(pk__in=missing_price_ids).values_list("pk", "price")
+    ) if missing_price_ids else {}
+    unknown_ids = missing_price_ids - prices.keys()
+    if unknown_ids:
+        raise Service.DoesNotExist(f"Unknown service ids: {sorted(unknown_ids)}")
+    entries = []
+    for service_id, quantity, *price in lines:
+        price = price[0] if price and price[0] else prices[service_id]
+        entries.append(OrderEntry(
+            order=order,
+            service_id=service_id,
+            quantity=Decimal(str(quantity)),
+            price=Decimal(str(price)),
+        ))
+    created = OrderEntry.objects.bulk_create(entries)
+    order.order_sum += sum(entry.total for entry in created)
+    return created
@@ -0,0 +1,96 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from . import counters, events, notifications, versions
+from . models import CarModel, Car, Order, OrderComment, Service, OrderEntry, ReportDay, User, bulk_entry_delete
+
+
+@receiver(post_delete, sender=OrderEntry)
+def subtract_deleted_entry(sender, instance, origin=None, **kwargs):
+    # the order itself is going away, nothing to keep in sync
+    if isinstance(origin, Order) or getattr(origin, "model", None) is Order:
+        return
+    # cascades (e.g. deleting a Service) still land here one entry at a time
+    if not bulk_entry_delete.get():
+        Order.objects.apply_sum_deltas({instance.order_id: -instance.total})
+        Order.objects.filter(pk=instance.order_id).mark_report_days()
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=OrderEntry)
+@receiver(post_save, sender=Car)
+def count_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.adjust(sender, 1)
+
+
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=OrderEntry)
+@receiver(post_delete, sender=Car)
+def count_deleted(sender, instance, **kwargs):
+    counters.adjust(sender, -1)
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_save, sender=CarModel)
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=Car)
+@receiver(post_delete, sender=CarModel)
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=User)
+def bump_fragment_version(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {"last_login"}:
+        return
+    versions.bump(sender._meta.label, [instance.pk])
+    if sender is CarModel:
+        versions.bump(Car._meta.label, instance.cars.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def mark_order_report_day(sender, instance, raw=False, **kwargs):
+    if not raw:
+        ReportDay.objects.mark([instance.date])
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_save, sender=CarModel)
+def mark_make_report_days(sender, instance, created, raw=False, **kwargs):
+    # revenue is rolled up by make, which follows the car model
+    if created or raw:
+        return
+    orders = Order.objects.filter(car=instance) if sender is Car else Order.objects.filter(car__car_model=instance)
+    orders.mark_report_days()
+
+
+@receiver(post_save, sender=Order)
+def order_status_changed(sender, instance, created, raw=False, **kwargs):
+    saved_status = instance.__dict__.get("_saved_status")
+    instance._saved_status = instance.status
+    if raw or saved_status == instance.status:
+        return
+    # new orders show up on the live board too
+    events.publish_status(instance)
+    if created or saved_status is None:
+        return
+    email = notifications.status_email(instance)
+    if email:
+        notifications.queue([email])
+
+
+@receiver(post_save, sender=OrderComment)
+def queue_comment_email(sender, instance, created, raw=False, **kwargs):
+    # customers are not told about their own comments
+    if not created or raw or instance.commenter_id == instance.order.customer_id:
+        return
+    email = notifications.comment_email(instance)
+    if email:
+        notifications.queue([email])
+
+
+@receiver(post_delete, sender=OrderComment)
+def touch_commented_order(sender, instance, origin=None, **kwargs):
+    # a removed comment leaves no timestamp behind, the order carries the change
+    if not isinstance(origin, Order):
+        Order.objects.filter(pk=instance.order_id).update(updated_at=timezone.now())
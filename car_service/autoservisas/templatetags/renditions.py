@@ -0,0 +1,11 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag
+def rendition(obj, field_name, size):
+    """URL of a sized copy of ``obj``'s image, e.g. ``{% rendition car 'car_img' 'list' %}``."""
+    if not obj:
+        return ''
+    return obj.rendition_url(field_name, size)
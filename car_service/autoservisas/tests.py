@@ -1,3 +1,926 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+from base64 import urlsafe_b64encode
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from zipfile import ZipFile
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.http import Http404, HttpResponse
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Max, Sum
+from django.conf import settings
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from . models import CarModel, Car, Order, Service, OrderEntry, OrderComment, OrderStatusEvent, OutboxEmail, RevenueRollup
+from . import benchmarks, events, exports, notifications, reports, views
+from . images import rendition_name
+from . importers import import_catalog, import_fleet, read_records
+from . instrumentation import InstrumentationMiddleware, assert_query_budget, histogram
+from . pagination import CursorPaginator
+from . search import search_cars, search_orders
+from . services import add_entries
+from . visits import pending_key
 
-# Create your tests here.
+
+class OrderTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        car_model = CarModel.objects.create(make="Audi", model="A4", year=2010)
+        cls.car = Car.objects.create(plate_number="ABC123", vin_code="VIN1", car_model=car_model)
+        cls.oil = Service.objects.create(name="Oil change", price=Decimal("30.00"))
+        cls.tyres = Service.objects.create(name="Tyres", price=Decimal("12.50"))
+
+    def setUp(self):
+        self.order = Order.objects.create(car=self.car)
+
+    def assertOrderSum(self, order, expected):
+        order.refresh_from_db(fields=["order_sum"])
+        self.assertEqual(order.order_sum, Decimal(expected))
+
+
+class OrderSumTestCase(OrderTestCase):
+    def test_save_applies_delta(self):
+        entry = OrderEntry.objects.create(order=self.order, service=self.oil)
+        OrderEntry.objects.create(order=self.order, service=self.tyres, quantity=4)
+        self.assertOrderSum(self.order, "80.00")
+        entry.quantity = 2
+        entry.save()
+        self.assertOrderSum(self.order, "110.00")
+
+    def test_save_moves_entry_between_orders(self):
+        other = Order.objects.create(car=self.car)
+        entry = OrderEntry.objects.create(order=self.order, service=self.oil)
+        entry.order = other
+        entry.save()
+        self.assertOrderSum(self.order, "0.00")
+        self.assertOrderSum(other, "30.00")
+
+    def test_delete(self):
+        entry = OrderEntry.objects.create(order=self.order, service=self.oil)
+        OrderEntry.objects.create(order=self.order, service=self.tyres)
+        entry.delete()
+        self.assertOrderSum(self.order, "12.50")
+        self.tyres.delete()
+        self.assertOrderSum(self.order, "0.00")
+
+    def test_bulk_paths(self):
+        OrderEntry.objects.bulk_create([
+            OrderEntry(order=self.order, service=self.oil, price=Decimal("30.00")),
+            OrderEntry(order=self.order, service=self.tyres, price=Decimal("12.50"), quantity=2),
+        ])
+        self.assertOrderSum(self.order, "55.00")
+        OrderEntry.objects.filter(service=self.tyres).update(quantity=4)
+        self.assertOrderSum(self.order, "80.00")
+        OrderEntry.objects.filter(order=self.order).delete()
+        self.assertOrderSum(self.order, "0.00")
+
+    def test_saving_a_stale_order_keeps_the_sum(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        OrderEntry.objects.create(order=self.order, service=self.oil)
+        stale.status = 2
+        stale.save()
+        self.assertOrderSum(self.order, "30.00")
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 2)
+        stale.order_sum = Decimal("5.00")
+        stale.save(update_fields=["order_sum"])
+        self.assertOrderSum(self.order, "5.00")
+
+    def test_admin_shows_order_sum_read_only(self):
+        self.client.force_login(get_user_model().objects.create_superuser(username="admin", password="secret"))
+        response = self.client.get(reverse("admin:autoservisas_order_change", args=[self.order.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("order_sum", response.context["adminform"].form.fields)
+
+    def test_recompute_order_sums_command(self):
+        OrderEntry.objects.create(order=self.order, service=self.oil)
+        Order.objects.filter(pk=self.order.pk).update(order_sum=Decimal("1.00"))
+        call_command("recompute_order_sums", stdout=StringIO())
+        self.assertOrderSum(self.order, "30.00")
+
+
+class AddEntriesTestCase(OrderTestCase):
+    def test_add_entries(self):
+        lines = [(self.oil.pk, 1), (self.tyres.pk, 4), (self.oil.pk, 2, Decimal("25.00"))]
+        with self.assertNumQueries(6):
+            entries = add_entries(self.order, lines * 10)
+        self.assertEqual(len(entries), 30)
+        self.assertEqual(self.order.order_sum, Decimal("1300.00"))
+        self.assertOrderSum(self.order, "1300.00")
+
+    def test_unknown_service(self):
+        with self.assertRaises(Service.DoesNotExist):
+            add_entries(self.order, [(0, 1)])
+
+
+class OrderDetailQueriesTestCase(OrderTestCase):
+    def add_comments(self, count):
+        start = self.order.comments.count()
+        for number in range(start, start + count):
+            commenter = get_user_model().objects.create(username=f"commenter{number}")
+            OrderComment.objects.create(order=self.order, commenter=commenter, content="Hello")
+
+    def test_query_budget_does_not_grow_with_comments(self):
+        add_entries(self.order, [(self.oil.pk, 1), (self.tyres.pk, 4)])
+        url = reverse('order_details', kwargs={'pk': self.order.pk})
+        self.add_comments(1)
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        self.add_comments(20)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertContains(response, "commenter", count=21)
+
+
+class DashboardCountersTestCase(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_warm_index_runs_no_counts(self):
+        self.client.get(reverse('index'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('index'))
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+        self.assertEqual(response.context['count_cars'], 1)
+        self.assertEqual(response.context['services_count'], 2)
+
+    def test_signals_keep_counters_current(self):
+        self.client.get(reverse('index'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Car.objects.create(plate_number="XYZ999", vin_code="VIN2", car_model=self.car.car_model)
+            add_entries(self.order, [(self.oil.pk, 1), (self.tyres.pk, 1)])
+            self.tyres.delete()
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['count_cars'], 2)
+        self.assertEqual(response.context['services_count'], 1)
+        self.assertEqual(response.context['services_done'], 1)
+
+
+class CarSearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        audi = CarModel.objects.create(make="Audi", model="A4 Avant", year=2010)
+        bmw = CarModel.objects.create(make="BMW", model="320d", year=2015)
+        cls.audi = Car.objects.create(plate_number="abc 123", vin_code="WAUZZZ8K9BA000001", car_model=audi)
+        cls.bmw = Car.objects.create(plate_number="KLM456", vin_code="WBA3D31000F000002", car_model=bmw)
+
+    def search(self, query):
+        return list(search_cars(Car.objects.all(), query))
+
+    def test_plate_prefix(self):
+        self.assertEqual(self.search("ABC1"), [self.audi])
+        self.assertEqual(self.search("klm 4"), [self.bmw])
+
+    def test_vin(self):
+        self.assertEqual(self.search("wbA3d31000F000002"), [self.bmw])
+        self.assertEqual(self.search("WAUZZZ8K9B"), [self.audi])
+
+    def test_make_and_model(self):
+        self.assertEqual(self.search("audi"), [self.audi])
+        self.assertEqual(self.search("320"), [self.bmw])
+        self.assertEqual(self.search("audi a4 avant"), [self.audi])
+        self.assertEqual(self.search("bmw a4"), [])
+
+
+class OrderSearchTestCase(OrderTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.car.customer = get_user_model().objects.create(username="jonas", first_name="Jonas", last_name="Jonaitis")
+        cls.car.save()
+
+    def search(self, query):
+        return list(search_orders(Order.objects.all(), query))
+
+    def test_customer_follows_car_owner(self):
+        owner = get_user_model().objects.create(username="owner")
+        car = Car.objects.get(pk=self.car.pk)
+        car.customer = owner
+        car.save()
+        self.assertEqual(Order.objects.get(pk=self.order.pk).customer, owner)
+        self.assertEqual(Order.objects.create(car=car).customer, owner)
+
+    def test_dates(self):
+        Order.objects.filter(pk=self.order.pk).update(date=date(2023, 6, 7))
+        for query in ["2023", "2023-06", "2023-6-7", "2023-05..2023-06"]:
+            self.assertEqual(self.search(query), [self.order], query)
+        for query in ["2022", "2023-06-08", "2023-07..2023-12"]:
+            self.assertEqual(self.search(query), [], query)
+
+    def test_plate_and_customer(self):
+        self.assertEqual(self.search("abc"), [self.order])
+        self.assertEqual(self.search("JONAS"), [self.order])
+        self.assertEqual(self.search("jon jonai"), [self.order])
+        self.assertEqual(self.search("petras"), [])
+        with self.assertNumQueries(1):
+            self.search("jonas")
+
+    def test_non_ascii_names(self):
+        owner = get_user_model().objects.create(username="sarunas", first_name="Šarūnas", last_name="Žukauskas")
+        car = Car.objects.create(plate_number="LT001", vin_code="VIN2", car_model=self.car.car_model, customer=owner)
+        order = Order.objects.create(car=car)
+        self.assertEqual(self.search("šarūnas"), [order])
+        self.assertEqual(self.search("ŠAR žuk"), [order])
+        owner.last_name = "Čepas"
+        owner.save()
+        self.assertEqual(self.search("čep"), [order])
+        self.assertEqual(self.search("žuk"), [])
+
+
+class CursorPaginationTestCase(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        Order.objects.bulk_create([Order(car=self.car) for _ in range(6)])
+        self.orders = list(Order.objects.all())
+
+    def test_walk_forward_and_back(self):
+        paginator = CursorPaginator(Order.objects.all(), 3, ("date", "id"))
+        first = paginator.get_page(None)
+        self.assertEqual(list(first), self.orders[:3])
+        self.assertFalse(first.has_previous())
+        with CaptureQueriesContext(connection) as queries:
+            second = paginator.get_page(first.next_cursor)
+        self.assertEqual(list(second), self.orders[3:6])
+        self.assertFalse([query for query in queries if 'OFFSET' in query['sql'] or 'COUNT(' in query['sql']])
+        third = paginator.get_page(second.next_cursor)
+        self.assertEqual(list(third), self.orders[6:])
+        self.assertFalse(third.has_next())
+        self.assertEqual(list(paginator.get_page(third.previous_cursor)), self.orders[3:6])
+        self.assertEqual(list(paginator.get_page(first.last_cursor)), self.orders[4:])
+        self.assertEqual(list(paginator.get_page("n.garbage")), self.orders[:3])
+        bad_key = urlsafe_b64encode(json.dumps(["2023-13-45", "x"]).encode()).decode()
+        self.assertEqual(list(paginator.get_page(f"n.{bad_key}")), self.orders[:3])
+        self.assertEqual(self.client.get(reverse('order_list'), {'cursor': f"n.{bad_key}"}).status_code, 200)
+
+    def test_car_list_by_make(self):
+        bmw = CarModel.objects.create(make="BMW", model="X5", year=2015)
+        alfa = CarModel.objects.create(make="Alfa Romeo", model="159", year=2008)
+        Car.objects.bulk_create([Car(plate_number=f"CAR{n}", vin_code="VIN", car_model=car_model) for n, car_model in enumerate([bmw, alfa, bmw])])
+        expected = list(Car.objects.order_by('car_model__make', 'id'))
+        response = self.client.get(reverse('car_list'))
+        self.assertEqual(list(response.context['car_list']), expected[:3])
+        response = self.client.get(reverse('car_list'), {'cursor': response.context['car_list'].next_cursor})
+        self.assertEqual(list(response.context['car_list']), expected[3:])
+        self.assertEqual([car.car_model.make for car in expected], ["Alfa Romeo", "Audi", "BMW", "BMW"])
+
+    def test_order_list_view(self):
+        response = self.client.get(reverse('order_list'))
+        self.assertEqual(list(response.context['order_list']), self.orders[:3])
+        response = self.client.get(reverse('order_list'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(list(response.context['order_list']), self.orders[3:6])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), IMAGE_PROCESSING_WORKERS=0)
+class ImageRenditionsTestCase(OrderTestCase):
+    def upload(self):
+        output = BytesIO()
+        Image.new('RGB', (2000, 1500), 'red').save(output, 'PNG')
+        return SimpleUploadedFile('car.png', output.getvalue(), content_type='image/png')
+
+    def test_renditions_made_once_per_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car.car_img = self.upload()
+            self.car.save()
+        car = Car.objects.get(pk=self.car.pk)
+        self.assertTrue(car.car_img_hash)
+        thumbnail = car.car_img.storage.open(rendition_name(car.car_img_hash, 'thumbnail'))
+        self.assertEqual(Image.open(thumbnail).size, (96, 72))
+        self.assertTrue(car.rendition_url('car_img', 'list').endswith('_list.webp'))
+        car.plate_number = 'XYZ999'
+        car.save()
+        self.assertEqual(Car.objects.get(pk=car.pk).car_img_hash, car.car_img_hash)
+
+    def test_existing_images_get_renditions(self):
+        # uploaded before renditions existed, no job ever ran for it
+        with self.captureOnCommitCallbacks(execute=False):
+            self.car.car_img = self.upload()
+            self.car.save()
+        Car.objects.create(plate_number="NOIMG1", vin_code="VIN", car_model=self.car.car_model)
+        self.assertEqual(Car.objects.get(pk=self.car.pk).car_img_hash, "")
+        call_command("make_renditions", batch_size=1, stdout=StringIO())
+        car = Car.objects.get(pk=self.car.pk)
+        self.assertTrue(car.car_img.storage.exists(rendition_name(car.car_img_hash, "thumbnail")))
+        self.assertTrue(car.rendition_url("car_img", "list").endswith("_list.webp"))
+
+
+class InstrumentationTestCase(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        histogram.clear()
+
+    def test_histogram_and_report(self):
+        self.client.get(reverse('index'))
+        self.client.get(reverse('order_details', kwargs={'pk': self.order.pk}))
+        staff = get_user_model().objects.create(username="staff", is_staff=True)
+        self.client.force_login(staff)
+        report = self.client.get(reverse('instrumentation_report')).json()
+        self.assertEqual(report['index']['count'], 1)
+        self.assertGreater(report['index']['queries']['max'], 0)
+        self.assertGreater(report['order_details']['template_ms']['max'], 0)
+        self.assertGreater(report['order_details']['size']['max'], 0)
+
+    def test_views_within_budget(self):
+        for path in [reverse('index'), reverse('order_details', kwargs={'pk': self.order.pk})]:
+            assert_query_budget(self.client, path)
+        with self.assertRaises(AssertionError):
+            assert_query_budget(self.client, reverse('order_list'), budget=0)
+
+    def test_unresolved_paths_share_one_entry(self):
+        for number in range(3):
+            self.client.get(f'/scanner/probe{number}.php')
+        self.assertEqual(histogram.report()['<unresolved>']['count'], 3)
+        self.assertEqual(len(histogram.report()), 1)
+
+    def test_form_posts_get_the_default_budget(self):
+        commenter = get_user_model().objects.create(username="mechanic")
+        self.client.force_login(commenter)
+        path = reverse('order_details', kwargs={'pk': self.order.pk})
+        data = {'order': self.order.pk, 'commenter': commenter.pk, 'content': 'Ready'}
+        with self.assertNoLogs('autoservisas.instrumentation', 'WARNING'):
+            assert_query_budget(self.client, path, method='post', data=data)
+
+
+class SyntheticDataTestCase(TestCase):
+    def test_generate_data_and_benchmark(self):
+        call_command(
+            'generate_data', users=5, cars=10, orders=30, comments=20, batch_size=7, stdout=StringIO(),
+        )
+        self.assertEqual(Order.objects.count(), 30)
+        self.assertEqual(Order.objects.recompute_sums(dry_run=True), 0)
+        self.assertFalse(Order.objects.filter(customer__isnull=True, car__customer__isnull=False).exists())
+        customer = Order.objects.filter(customer__isnull=False).first().customer
+        self.assertTrue(search_orders(Order.objects.all(), customer.first_name).exists())
+        report = benchmarks.run(repeat=1, warmup=0, host='testserver')
+        self.assertEqual({result['status'] for result in report['results'].values()}, {200})
+        self.assertEqual(benchmarks.compare(report, report, threshold=0), [])
+
+
+class FragmentCacheTestCase(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_unchanged_rows_come_from_cache(self):
+        Car.objects.bulk_create([Car(plate_number=f"CAR{number}", vin_code="VIN", car_model=self.car.car_model) for number in range(2)])
+        self.client.get(reverse('car_list'))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('car_list'))
+
+    def test_changes_invalidate_rows(self):
+        self.client.get(reverse('order_list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            add_entries(self.order, [(self.oil.pk, 1)])
+        self.assertContains(self.client.get(reverse('order_list')), "30.00")
+        car_model = self.car.car_model
+        with self.captureOnCommitCallbacks(execute=True):
+            car_model.model = "A6"
+            car_model.save()
+        self.assertContains(self.client.get(reverse('order_list')), "Audi A6")
+        self.assertContains(self.client.get(reverse('car_list')), "Audi A6")
+
+
+@override_settings(VISIT_COUNTER_FLUSH_EVERY=10, VISIT_COUNTER_FLUSH_SECONDS=3600)
+class VisitCounterTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_session_saved_in_batches(self):
+        session_saves = 0
+        for visit in range(1, 26):
+            response = self.client.get(reverse('index'))
+            self.assertEqual(response.context['num_visits'], visit)
+            session_saves += settings.SESSION_COOKIE_NAME in response.cookies
+        # the first visit and every tenth one after it
+        self.assertEqual(session_saves, 3)
+
+    def test_flushed_keys_are_dropped(self):
+        for visit in range(10):
+            self.client.get(reverse('index'))
+        session_key = self.client.session.session_key
+        for visit in range(10):
+            self.client.get(reverse('index'))
+        # flushed on the tenth visit after the first save, its pending key went with it
+        self.assertIsNone(cache.get(pending_key(session_key)))
+
+
+class ExportTestCase(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        add_entries(self.order, [(self.oil.pk, 1), (self.tyres.pk, 4)])
+        Order.objects.filter(pk=self.order.pk).update(date=date(2023, 6, 7), status=3)
+        self.client.force_login(get_user_model().objects.create(username="accountant", is_staff=True))
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_orders', kwargs={'file_format': 'csv'}), params)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_csv_filters(self):
+        lines = self.export(period='2023-06', status=3)
+        self.assertEqual(len(lines), 3)
+        self.assertIn('Oil change', lines[1] + lines[2])
+        self.assertEqual(len(self.export(period='2023-07')), 1)
+        self.assertEqual(len(self.export(status=4)), 1)
+
+    def test_bad_period(self):
+        response = self.client.get(reverse('export_orders', kwargs={'file_format': 'csv'}), {'period': 'June'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command(self):
+        output = StringIO()
+        call_command('export_orders', period='2023', stdout=output)
+        self.assertEqual(len(output.getvalue().splitlines()), 3)
+
+    def test_formulas_exported_as_text(self):
+        plate = '=HYPERLINK("http://example.com","x")'
+        Car.objects.filter(pk=self.car.pk).update(plate_number=plate)
+        self.assertIn("'" + plate.replace('"', '""'), self.export()[1])
+        path = f"{tempfile.mkdtemp()}/orders.xlsx"
+        exports.write_xlsx(path)
+        with ZipFile(path) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertNotIn('<f>', sheet)
+        self.assertIn(f't="inlineStr"><is><t>{plate}</t>', sheet)
+
+
+class ImportTestCase(TestCase):
+    def write(self, name, content):
+        path = f"{tempfile.mkdtemp()}/{name}"
+        with open(path, "w") as source:
+            source.write(content)
+        return path
+
+    def test_catalog_and_fleet(self):
+        CarModel.objects.create(make="Audi", model="A4", engine="2.0", year=2010)
+        catalog = self.write("catalog.csv", (
+            "make,model,engine,year\n"
+            "audi,a4,2.0,2010\n"
+            "BMW,320d,2.0,2015\n"
+            "BMW,320d,2.0,2015\n"
+            "Opel,,1.6,2001\n"
+            "Opel,Astra,1.6,new\n"
+        ))
+        errors = StringIO()
+        call_command("import_catalog", catalog, batch_size=1, stdout=StringIO(), stderr=errors)
+        self.assertEqual(CarModel.objects.count(), 2)
+        self.assertEqual(len(errors.getvalue().splitlines()), 2)
+        customer = get_user_model().objects.create(username="fleet")
+        fleet = self.write("fleet.jsonl", "\n".join([
+            '{"plate_number": "abc 001", "vin_code": "VIN001", "make": "BMW", "model": "320D", "engine": "2.0", "year": 2015}',
+            '{"plate_number": "ABC001", "vin_code": "VIN002", "make": "BMW", "model": "320d", "engine": "2.0", "year": 2015}',
+            '{"plate_number": "ABC003", "vin_code": "VIN003", "make": "Fiat", "model": "Uno", "year": 1990}',
+        ]))
+        call_command("import_fleet", fleet, customer="fleet", stdout=StringIO(), stderr=StringIO())
+        car = Car.objects.get()
+        self.assertEqual((car.normalized_plate, car.customer, car.car_model.make), ("ABC001", customer, "BMW"))
+
+    def test_rejects_invalid_rows(self):
+        CarModel.objects.create(make="BMW", model="320d", engine="2.0", year=2015)
+        customer = get_user_model().objects.create(username="fleet")
+        fleet = self.write("fleet.jsonl", "\n".join([
+            '[]',
+            '"x"',
+            '{"plate_number": "ABC009", "vin_code":',
+            '{"plate_number": "%s", "vin_code": "VIN001", "make": "BMW", "model": "320d", "engine": "2.0", "year": 2015}' % ("A" * 51),
+            '{"plate_number": "ABC002", "vin_code": "VIN002", "make": "BMW", "model": "320d", "engine": "2.0", "year": 2015}',
+        ]))
+        report = import_fleet(read_records(fleet), customer)
+        self.assertEqual(report.created, 1)
+        self.assertEqual([line for line, reason in report.rejected], [1, 2, 3, 4])
+        self.assertIn("bad JSON", report.rejected[2][1])
+        self.assertIn("plate_number", report.rejected[3][1])
+        report = import_catalog([(1, {"make": "M" * 101, "model": "X", "year": 2000})])
+        self.assertEqual((report.created, report.rejected[0][0]), (0, 1))
+
+    def test_csv_saved_by_excel(self):
+        catalog = self.write("catalog.csv", "\ufeffmake,model,engine,year\r\nBMW,320d,2.0,2015\r\n")
+        report = import_catalog(read_records(catalog))
+        self.assertEqual((report.created, report.rejected), (1, []))
+
+
+class ReportTestCase(OrderTestCase):
+    def live(self):
+        entries = OrderEntry.objects.exclude(order__status__in=reports.EXCLUDED_STATUSES).order_by()
+        return {
+            "by_service": dict(entries.values_list("service_id").annotate(Sum("total"))),
+            "by_make": dict(entries.values_list("order__car__car_model__make").annotate(Sum("total"))),
+            "by_day": dict(entries.values_list("order__date").annotate(Sum("total"))),
+            "by_status": dict(Order.objects.order_by().values_list("status").annotate(Count("pk"))),
+        }
+
+    def assertRollupsMatchLive(self):
+        reports.refresh()
+        summary = reports.summary()
+        self.assertEqual({
+            "by_service": {row["service_id"]: row["revenue"] for row in summary["by_service"]},
+            "by_make": {row["make"]: row["revenue"] for row in summary["by_make"]},
+            "by_day": {row["day"]: row["revenue"] for row in summary["by_day"]},
+            "by_status": {row["status"]: row["orders"] for row in summary["by_status"]},
+        }, self.live())
+
+    def test_rollups_follow_writes(self):
+        old = Order.objects.create(car=self.car, status=4)
+        add_entries(old, [(self.oil.pk, 2), (self.tyres.pk, 1)])
+        Order.objects.filter(pk=old.pk).update(date=date(2023, 5, 17))
+        self.assertEqual(reports.rebuild(), 2)
+        self.assertRollupsMatchLive()
+
+        entry = OrderEntry.objects.create(order=self.order, service=self.oil)
+        add_entries(self.order, [(self.tyres.pk, 4)])
+        entry.quantity = 3
+        entry.save()
+        OrderEntry.objects.filter(order=old).update(price=Decimal("10.00"))
+        self.assertRollupsMatchLive()
+
+        self.car.car_model = CarModel.objects.create(make="BMW", model="320d", year=2015)
+        self.car.save()
+        self.order.status = 5
+        self.order.save()
+        self.assertRollupsMatchLive()
+
+        entry.delete()
+        self.tyres.delete()
+        old.delete()
+        self.assertRollupsMatchLive()
+        self.assertFalse(RevenueRollup.objects.filter(day=date(2023, 5, 17)).exists())
+
+    def test_report_view_reads_rollups_only(self):
+        add_entries(self.order, [(self.oil.pk, 1)])
+        reports.refresh()
+        url = reverse('report')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(get_user_model().objects.create(username="manager", is_staff=True))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'period': date.today().strftime('%Y-%m')})
+        self.assertContains(response, "30.00")
+        self.assertFalse([query for query in queries if "orderentry" in query["sql"].lower()])
+
+
+class OverdueOrdersTestCase(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        yesterday = date.today() - timedelta(days=1)
+        self.car.customer = get_user_model().objects.create(username="owner", email="owner@example.com")
+        self.car.save()
+        self.late = Order.objects.create(car=self.car, status=2, due_back=yesterday)
+        Order.objects.create(car=self.car, status=4, due_back=yesterday)
+        Order.objects.create(car=self.car, status=1, due_back=date.today())
+
+    def test_overdue(self):
+        self.assertEqual(list(Order.objects.overdue()), [self.late])
+        self.assertEqual([order.is_overdue for order in Order.objects.order_by("pk")], [False, True, False, False])
+        # as a subquery the status test must read the inner, aliased table
+        self.assertEqual(list(Car.objects.filter(pk__in=Order.objects.overdue().values("car"))), [self.car])
+
+    def test_overdue_view_is_for_staff(self):
+        url = reverse("overdue_orders")
+        self.client.force_login(self.car.customer)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(get_user_model().objects.create(username="manager", is_staff=True))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(list(response.context["orders"]), [self.late])
+        self.assertContains(response, "ABC123")
+        order_queries = [query["sql"] for query in queries if "autoservisas_" in query["sql"]]
+        # the page rows, nothing loaded lazily per row and no car notes
+        self.assertEqual(len(order_queries), 1)
+        self.assertNotIn('"note"', order_queries[0])
+
+    def test_sweep_emails_customers(self):
+        call_command("sweep_overdue_orders", batch_size=1, stdout=StringIO())
+        call_command("sweep_overdue_orders", stdout=StringIO())
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+        call_command("send_outbox", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["owner@example.com"])
+        self.assertIn("ABC123", mail.outbox[0].body)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError("mail server is down")
+
+
+class UnreachableEmailBackend(BaseEmailBackend):
+    def open(self):
+        raise ConnectionRefusedError("mail server is down")
+
+    def send_messages(self, email_messages):
+        raise AssertionError("sent without a connection")
+
+
+class RecordingEmailBackend(locmem.EmailBackend):
+    # the open savepoints and the outbox rows as the mail server sees them
+    sends = []
+
+    def send_messages(self, email_messages):
+        self.sends.append((list(connection.savepoint_ids), list(OutboxEmail.objects.values_list("attempts", "sent_at"))))
+        return super().send_messages(email_messages)
+
+
+class NotificationsTestCase(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = get_user_model().objects.create(username="owner", email="owner@example.com")
+        self.car.customer = self.customer
+        self.car.save()
+        self.order = Order.objects.get(pk=self.order.pk)
+
+    def test_status_change_is_queued_once(self):
+        self.order.save()
+        self.assertFalse(OutboxEmail.objects.exists())
+        for status in (3, 3, 4):
+            self.order.status = status
+            self.order.save()
+        # a queued change is not queued again
+        notifications.queue([notifications.status_email(self.order)])
+        self.order.status = 3
+        self.order.save()
+        self.assertEqual(
+            [key.rsplit("-", 1)[0] for key in OutboxEmail.objects.order_by("pk").values_list("key", flat=True)],
+            [f"order-{self.order.pk}-status-{status}" for status in (3, 4, 3)],
+        )
+        self.assertEqual(notifications.send_pending(batch_size=1), (3, 0))
+        self.assertEqual([message.to for message in mail.outbox], [["owner@example.com"]] * 3)
+        self.assertEqual(notifications.send_pending(), (0, 0))
+
+    @override_settings(EMAIL_BACKEND="autoservisas.tests.UnreachableEmailBackend")
+    def test_unreachable_mail_server_reschedules_batch(self):
+        # nothing to send, no connection attempted
+        self.assertEqual(notifications.send_pending(), (0, 0))
+        for status in (3, 4):
+            self.order.status = status
+            self.order.save()
+        self.assertEqual(notifications.send_pending(batch_size=1), (0, 1))
+        failed, waiting = OutboxEmail.objects.order_by("pk")
+        self.assertEqual((failed.attempts, failed.sent_at), (1, None))
+        self.assertIn("mail server is down", failed.last_error)
+        self.assertFalse(OutboxEmail.objects.pending().filter(pk=failed.pk).exists())
+        # the run stopped at the first batch
+        self.assertEqual((waiting.attempts, waiting.last_error), (0, ""))
+
+    @override_settings(EMAIL_BACKEND="autoservisas.tests.RecordingEmailBackend")
+    def test_emails_are_claimed_before_sending(self):
+        RecordingEmailBackend.sends = []
+        self.order.status = 3
+        self.order.save()
+        savepoints = list(connection.savepoint_ids)
+        self.assertEqual(notifications.send_pending(), (1, 0))
+        # sent outside the claiming transaction, with the attempt already recorded
+        self.assertEqual(RecordingEmailBackend.sends, [(savepoints, [(1, None)])])
+        email = OutboxEmail.objects.get()
+        self.assertIsNotNone(email.sent_at)
+        self.assertEqual(email.attempts, 1)
+
+    def test_comments_by_others_are_queued(self):
+        OrderComment.objects.create(order=self.order, commenter=self.customer, content="When?")
+        self.assertFalse(OutboxEmail.objects.exists())
+        mechanic = get_user_model().objects.create(username="mechanic")
+        self.client.force_login(mechanic)
+        self.client.post(reverse("order_details", kwargs={"pk": self.order.pk}), {
+            "content": "Tomorrow.", "order": self.order.pk, "commenter": mechanic.pk,
+        })
+        self.assertIn("Tomorrow.", OutboxEmail.objects.get().body)
+
+    @override_settings(EMAIL_BACKEND="autoservisas.tests.FailingEmailBackend")
+    def test_failed_email_backs_off(self):
+        self.order.status = 3
+        self.order.save()
+        self.assertEqual(notifications.send_pending(), (0, 1))
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.attempts, email.sent_at), (1, None))
+        self.assertIn("mail server is down", email.last_error)
+        self.assertFalse(OutboxEmail.objects.pending().exists())
+        self.assertTrue(OutboxEmail.objects.pending(now=email.send_after).exists())
+
+
+class CarNoteTestCase(OrderTestCase):
+    def test_note_is_cleaned_on_save(self):
+        self.car.note = (
+            '<p onclick="steal()">Brakes <b>squeak</b><script>steal()</script></p>'
+            '<a href=" javascript:steal()">bad</a><a href="https://example.com">good</a><img src=x onerror=steal()>'
+        )
+        self.car.save()
+        self.assertEqual(self.car.note_html, (
+            '<p>Brakes <b>squeak</b></p><a>bad</a>'
+            '<a href="https://example.com" rel="nofollow noopener">good</a>'
+        ))
+        self.assertEqual(self.car.note_excerpt, "Brakes squeak badgood")
+        response = self.client.get(reverse("order_details", kwargs={"pk": self.order.pk}))
+        self.assertContains(response, "<b>squeak</b>")
+        self.assertNotContains(response, "steal()")
+
+
+class ListProjectionTestCase(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        owner = get_user_model().objects.create(username="owner")
+        for number in range(3):
+            car = Car.objects.create(
+                plate_number=f"LST{number}", vin_code=f"VIN{number}", car_model=self.car.car_model,
+                customer=owner, note="<p>Long note</p>" * 100,
+            )
+            Order.objects.create(car=car)
+        cache.clear()
+
+    def test_list_pages_skip_heavy_columns(self):
+        for url in (reverse("car_list"), reverse("order_list")):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            # the page rows and nothing loaded lazily per row
+            self.assertEqual(len(queries), 1)
+            self.assertNotIn('"note"', queries[0]["sql"])
+            self.assertNotIn('"note_html"', queries[0]["sql"])
+
+    def test_compare_projections(self):
+        costs = benchmarks.compare_projections(page_size=10)
+        for name in ("car_list", "order_list"):
+            self.assertLess(costs[name]["list"]["columns"], costs[name]["full"]["columns"])
+            self.assertLess(costs[name]["list"]["bytes"], costs[name]["full"]["bytes"])
+
+
+class ConditionalGetTestCase(OrderTestCase):
+    def assertRevalidates(self, url, changes):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        for change in changes:
+            change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, change)
+            etag = response["ETag"]
+
+    def test_order_details(self):
+        # free entries leave order_sum alone, deleting one must still change the page
+        free_entry = OrderEntry.objects.create(order=self.order, service=Service.objects.create(name="Check", price=0))
+        entry = OrderEntry.objects.create(order=self.order, service=self.oil)
+        mechanic = get_user_model().objects.create(username="mechanic")
+        comment = OrderComment.objects.create(order=self.order, commenter=mechanic, content="Hello")
+
+        def edit_entry():
+            entry.quantity = 2
+            entry.save()
+
+        def edit_car():
+            self.car.plate_number = "XYZ999"
+            self.car.save()
+
+        self.assertRevalidates(reverse("order_details", kwargs={"pk": self.order.pk}), [
+            free_entry.delete,
+            edit_entry,
+            entry.delete,
+            lambda: OrderComment.objects.create(order=self.order, commenter=mechanic, content="Ready"),
+            comment.delete,
+            edit_car,
+            lambda: self.client.force_login(mechanic),
+        ])
+
+    def test_car_detail(self):
+        def edit_car():
+            self.car.vin_code = "VIN2"
+            self.car.save()
+
+        self.assertRevalidates(reverse("car_detail", kwargs={"pk": self.car.pk}), [edit_car])
+        self.assertEqual(self.client.get(reverse("car_detail", kwargs={"pk": 0})).status_code, 404)
+
+
+class RecordingBroker(events.LocalBroker):
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, message):
+        self.published.append(message)
+        super().publish(message)
+
+
+class OrderEventsTestCase(OrderTestCase):
+    @override_settings(ORDER_EVENTS_BROKER="autoservisas.tests.RecordingBroker")
+    def test_status_changes_are_published_on_commit(self):
+        broker = events.get_broker()
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(car=self.car)
+            order.save()
+            order.status = 2
+            order.save()
+        self.assertEqual(
+            [(message["id"], message["label"], message["plate_number"]) for message in broker.published],
+            [(order.pk, "Registered", "ABC123"), (order.pk, "Being fixed", "ABC123")],
+        )
+
+    async def test_stream_sends_published_statuses(self):
+        response = await self.async_client.get(reverse("order_events"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b"retry: 5000\n\n")
+        pending = asyncio.ensure_future(anext(chunks))
+        # let the stream subscribe before publishing
+        await asyncio.sleep(0.05)
+        events.get_broker().publish(events.status_message(7, 3, "ABC123"))
+        chunk = await asyncio.wait_for(pending, 1)
+        self.assertTrue(chunk.startswith(b"event: status\n"))
+        self.assertIn(b'"label": "Fixed"', chunk)
+        await chunks.aclose()
+
+    @override_settings(ORDER_EVENTS_STREAM_SECONDS=0.05, ORDER_EVENTS_KEEPALIVE_SECONDS=0.02)
+    async def test_stream_ends_for_reconnect(self):
+        response = await self.async_client.get(reverse("order_events"))
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(chunks[0], b"retry: 5000\n\n")
+        self.assertIn(b": keepalive\n\n", chunks)
+        self.assertFalse(events.get_broker().subscribers)
+
+    @override_settings(ORDER_EVENTS_BROKER="autoservisas.events.PollingBroker", ORDER_EVENTS_POLL_SECONDS=0.01)
+    async def test_polling_broker_reads_changed_orders(self):
+        broker = events.get_broker()
+        async with broker.subscribe() as queue:
+            await asyncio.sleep(0.05)
+            self.order.status = 3
+            await sync_to_async(self.order.save)()
+            message = await asyncio.wait_for(queue.get(), 1)
+        self.assertEqual((message["id"], message["status"]), (self.order.pk, 3))
+
+    @override_settings(ORDER_EVENTS_BROKER="autoservisas.events.PollingBroker", ORDER_EVENTS_POLL_SECONDS=0.01)
+    async def test_polling_broker_delivers_late_commits(self):
+        last_id = (await OrderStatusEvent.objects.aaggregate(last_id=Max("pk")))["last_id"] or 0
+        broker = events.get_broker()
+        async with broker.subscribe() as queue:
+            await asyncio.sleep(0.05)
+            # the transaction holding the lower id commits second
+            for event_id, status in [(last_id + 2, 3), (last_id + 1, 2)]:
+                await OrderStatusEvent.objects.acreate(pk=event_id, order=self.order, status=status)
+                message = await asyncio.wait_for(queue.get(), 1)
+                self.assertEqual(message["status"], status)
+
+    def test_board_needs_asgi_for_events(self):
+        self.assertContains(self.client.get(reverse("order_board")), "ABC123")
+        self.assertEqual(self.client.get(reverse("order_events")).status_code, 501)
+
+
+class AsyncViewsTestCase(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    async def get(self, view, path, **kwargs):
+        request = AsyncRequestFactory().get(path, headers=kwargs.pop("headers", None))
+        request.user = AnonymousUser()
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        response = await view(request, **kwargs)
+        if hasattr(response, "render"):
+            await sync_to_async(response.render)()
+        return response
+
+    async def test_index(self):
+        response = await self.get(views.aindex, reverse("index"))
+        self.assertEqual(response.context_data["count_cars"], 1)
+        self.assertEqual(response.context_data["num_visits"], 1)
+
+    async def test_lists_match_sync_views(self):
+        for view, name, key in [
+            (views.acar_list, "car_list", "car_list"),
+            (views.AsyncOrderListView.as_view(), "order_list", "order_list"),
+        ]:
+            expected = (await sync_to_async(self.client.get)(reverse(name) + "?query=ABC")).context[key]
+            response = await self.get(view, reverse(name) + "?query=ABC")
+            rows = list(response.context_data[key])
+            self.assertEqual(rows, list(expected))
+            self.assertEqual(len(rows), 1)
+            self.assertTrue(rows[0].fragment_version)
+
+    async def test_car_detail_conditional(self):
+        path = reverse("car_detail", kwargs={"pk": self.car.pk})
+        response = await self.get(views.acar_detail, path, pk=self.car.pk)
+        self.assertContains(response, "ABC123")
+        self.assertIn("no-cache", response["Cache-Control"])
+        sync_response = await sync_to_async(self.client.get)(path)
+        self.assertEqual(response["ETag"], sync_response["ETag"])
+        response = await self.get(views.acar_detail, path, pk=self.car.pk, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        with self.assertRaises(Http404):
+            await self.get(views.acar_detail, path, pk=0)
+
+    async def test_instrumentation_counts_async_queries(self):
+        async def view(request):
+            await Car.objects.acount()
+            return HttpResponse("ok")
+
+        histogram.clear()
+        await InstrumentationMiddleware(view)(AsyncRequestFactory().get("/async-probe/"))
+        self.assertEqual(histogram.report()["<unresolved>"]["queries"]["max"], 1)
@@ -1,15 +1,28 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
 
+if settings.ASYNC_VIEWS:
+    read_views = (views.aindex, views.acar_list, views.acar_detail, views.AsyncOrderListView)
+else:
+    read_views = (views.index, views.car_list, views.car_detail, views.OrderListView)
+index, car_list, car_detail, order_list = read_views
+
 urlpatterns = [
-    path('', views.index, name='index'),
-    path('cars_list/', views.car_list, name='car_list'),
-    path('car_detail/<int:pk>/', views.car_detail, name='car_detail'),
-    path('orders/', views.OrderListView.as_view(), name='order_list'),
+    path('', index, name='index'),
+    path('cars_list/', car_list, name='car_list'),
+    path('car_detail/<int:pk>/', car_detail, name='car_detail'),
+    path('orders/', order_list.as_view(), name='order_list'),
     path('order_details/<int:pk>/', views.OrderDetailView.as_view(), name='order_details'),
+    path('orders/board/', views.order_board, name='order_board'),
+    path('orders/events/', views.order_events, name='order_events'),
+    path('orders/overdue/', views.OverdueOrderListView.as_view(), name='overdue_orders'),
     path('orders/my/', views.UserOrderListView.as_view(), name='user_orders'),
     path('car_list/my/', views.UserCarListView.as_view(), name='user_car_list'),
     path('car_list/car_create/', views.CarCreateView.as_view(), name='car_create'),
     path('order_list/order_create/', views.OrderCreateView.as_view(), name='order_create'),
+    path('instrumentation/', views.instrumentation_report, name='instrumentation_report'),
+    path('reports/', views.report, name='report'),
+    path('exports/orders.<str:file_format>', views.export_orders, name='export_orders'),
 ]
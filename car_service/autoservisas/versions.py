@@ -0,0 +1,92 @@
+from uuid import uuid4
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# what a cached list row of a model shows: (model label, attribute holding its pk)
+FRAGMENT_DEPENDENCIES = {
+    'autoservisas.Car': [
+        ('autoservisas.Car', 'pk'),
+        ('autoservisas.CarModel', 'car_model_id'),
+        (settings.AUTH_USER_MODEL, 'customer_id'),
+    ],
+    'autoservisas.Order': [
+        ('autoservisas.Order', 'pk'),
+        ('autoservisas.Car', 'car_id'),
+        (settings.AUTH_USER_MODEL, 'customer_id'),
+    ],
+}
+
+
+def version_key(label: str, pk) -> str:
+    return f'autoservisas:version:{label}:{pk}'
+
+
+def new_version() -> str:
+    return uuid4().hex[:12]
+
+
+def bump(label: str, pks) -> None:
+    """Give objects new versions once the transaction commits, so fragments keyed on the old ones are never read again.
+
+    Bumping earlier would let a concurrent request cache the old data under the new version.
+    """
+    keys = [version_key(label, pk) for pk in pks]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many({key: new_version() for key in keys}, None))
+
+
+def get_versions(keys) -> dict[str, str]:
+    """Versions of ``keys``, a missing one gets a fresh random version.
+
+    A version must never fall back to a default, or fragments rendered before
+    an eviction could be served again under that same default.
+    """
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+async def aget_versions(keys) -> dict[str, str]:
+    """``get_versions()`` for async views."""
+    versions = await cache.aget_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        await cache.aset_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+def _row_keys(objects) -> list[list[str]]:
+    dependencies = FRAGMENT_DEPENDENCIES[objects[0]._meta.label]
+    return [
+        [version_key(label, getattr(obj, attribute)) for label, attribute in dependencies if getattr(obj, attribute) is not None]
+        for obj in objects
+    ]
+
+
+def _set_versions(objects, row_keys, versions) -> None:
+    for obj, keys in zip(objects, row_keys):
+        # the pks take part too, pointing at another row changes the key
+        obj.fragment_version = '-'.join(f'{key.rsplit(":", 1)[1]}.{versions[key]}' for key in keys)
+
+
+def annotate_versions(objects) -> None:
+    """Set ``fragment_version`` on each of ``objects`` from the versions of everything its row shows."""
+    objects = list(objects)
+    if not objects:
+        return
+    row_keys = _row_keys(objects)
+    _set_versions(objects, row_keys, get_versions({key for keys in row_keys for key in keys}))
+
+
+async def aannotate_versions(objects) -> None:
+    """``annotate_versions()`` for async views."""
+    objects = list(objects)
+    if not objects:
+        return
+    row_keys = _row_keys(objects)
+    _set_versions(objects, row_keys, await aget_versions({key for keys in row_keys for key in keys}))
@@ -1,84 +1,237 @@
+import asyncio
+import json
 from typing import Any, Dict
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.conf import settings
 from django.contrib import messages
-from django.core.paginator import Paginator
+from django.core.handlers.asgi import ASGIRequest
 from datetime import date, timedelta
 from django.db.models.query import QuerySet
-from django.db.models import Q
+from django.db.models import Prefetch
 from django.utils.translation import gettext_lazy as _
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.response import TemplateResponse
 from django.urls import reverse, reverse_lazy
 from django.views import generic
+from . import events, exports, reports
+from . conditional import acar_changed, aconditional, car_changed, conditional, conditional_view, order_changed
+from . counters import aget_counters, get_counters
+from . instrumentation import histogram
 from . forms import OrderCommentForm, CarForm, OrderForm
-from . models import CarModel, Car, Order, Service, OrderEntry
+from . models import OPEN_STATUSES, CarModel, Car, Order, Service, OrderEntry, OrderComment
+from . pagination import CursorPaginator, CursorPaginationMixin
+from . search import parse_dates, search_cars, search_orders
+from . versions import aannotate_versions, annotate_versions
+from . visits import count_visit
 
 # Create your views here.
 
 def index(request):
-    # Suskaičiuokime keletą pagrindinių objektų
-    services_count = Service.objects.all().count()
-    services_done = OrderEntry.objects.all().count()
-    count_cars = Car.objects.all().count()
-    
-    # Apsilankymų skaitliukas
-    num_visits = request.session.get('num_visits', 1)
-    request.session['num_visits'] = num_visits + 1
-    
+    # Pagrindinių objektų skaitliukai laikomi cache
+    counters = get_counters()
+
+    # Apsilankymų skaitliukas, sesija įrašoma tik kas keletą apsilankymų
+    num_visits = count_visit(request)
+
     # perduodame informaciją į šabloną žodyno pavidale:
     context = {
-        'services_count': services_count,
-        'services_done': services_done,
-        'count_cars': count_cars,
         'num_visits': num_visits,
+        **counters,
     }
 
     return render(request, 'autoservisas/index.html', context)
 
+async def aindex(request):
+    # index ASGI serveriui, sesija skaitoma gijoje
+    context = {
+        'num_visits': await sync_to_async(count_visit)(request),
+        **await aget_counters(),
+    }
+    return TemplateResponse(request, 'autoservisas/index.html', context)
+
+@staff_member_required
+def instrumentation_report(request):
+    return JsonResponse(histogram.report())
+
+@staff_member_required
+def export_orders(request, file_format: str):
+    period = request.GET.get('period')
+    filename = f"orders-{period or 'all'}.{file_format}"
+    try:
+        statuses = [int(status) for status in request.GET.getlist('status')]
+        if file_format == 'csv':
+            # validate the filters before the streaming starts
+            exports.entries(period, statuses)
+            response = StreamingHttpResponse(exports.csv_lines(period, statuses), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+        if file_format == 'xlsx':
+            return FileResponse(exports.xlsx_file(period, statuses), as_attachment=True, filename=filename)
+    except (exports.ExportError, ValueError) as error:
+        return HttpResponseBadRequest(str(error))
+    raise Http404
+
+@staff_member_required
+def report(request):
+    period = request.GET.get('period', '')
+    dates = parse_dates(period) if period else (None, None)
+    if not dates:
+        messages.error(request, _('Cannot read period, use e.g. 2023-06 or 2023-01..2023-03.'))
+        dates = (None, None)
+    # tik suvestinės lentelės, užsakymų eilutės čia neskaitomos
+    return render(request, 'autoservisas/report.html', {
+        'period': period,
+        **reports.summary(*dates),
+    })
+
+def order_board(request):
+    # vieną kartą nupiešiama lenta, toliau ją atnaujina order_events srautas
+    orders = Order.objects.filter(status__in=OPEN_STATUSES).select_related('car').only(
+        'id', 'status', 'date', 'car__plate_number',
+    ).order_by('date', 'id')[:200]
+    return render(request, 'autoservisas/order_board.html', {'orders': orders})
+
+async def order_events(request):
+    """Server-sent events with every order status change, needs an ASGI server."""
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse('Serve the site with an ASGI server for live events.', status=501)
+
+    async def stream():
+        yield 'retry: 5000\n\n'
+        # Django 4.2 does not notice a closed tab while streaming, so every stream
+        # ends after a while and the browser reconnects; abandoned ones go away then
+        loop = asyncio.get_running_loop()
+        closes_at = loop.time() + settings.ORDER_EVENTS_STREAM_SECONDS
+        async with events.subscribe() as queue:
+            while (remaining := closes_at - loop.time()) > 0:
+                try:
+                    message = await asyncio.wait_for(queue.get(), min(settings.ORDER_EVENTS_KEEPALIVE_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    # keeps proxies from closing an idle stream
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'event: status\ndata: {json.dumps(message)}\n\n'
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# Car.Meta.ordering sorts by the model's make, the id breaks ties
+CAR_LIST_ORDERING = ('car_model__make', 'id')
+
 def car_list(request):
-    qs = Car.objects
+    # sąrašui užtenka ištraukos, pilnas pastabų HTML neskaitomas
+    qs = Car.objects.for_list()
     query = request.GET.get('query')
     if query:
-        qs = qs.filter(
-            Q(plate_number__istartswith=query) |
-            Q(car_model__make__icontains=query)
-        )
-    else:
-        qs = qs.all()
-    paginator = Paginator(qs, 3)
-    car_list = paginator.get_page(request.GET.get('page'))
+        qs = search_cars(qs, query)
+    paginator = CursorPaginator(qs, 3, ordering=CAR_LIST_ORDERING)
+    car_list = paginator.get_page(request.GET.get('cursor'))
+    annotate_versions(car_list)
     return render(request, 'autoservisas/cars_list.html', {
         'car_list': car_list,
     })
 
+@conditional(car_changed)
 def car_detail(request, pk: int):
     return render(request, 'autoservisas/car_detail.html', {
-        'car': get_object_or_404(Car, pk=pk)
+        'car': get_object_or_404(Car.objects.defer('note'), pk=pk)
     })
 
+# Async variants of the read-heavy pages for ASGI (settings.ASYNC_VIEWS). Queries
+# go through the async ORM, search and session lookups that have no async API
+# run in a thread, templates render in a thread once the view has returned.
 
-class OrderListView(generic.ListView):
+async def acar_list(request):
+    qs = Car.objects.for_list()
+    query = request.GET.get('query')
+    if query:
+        qs = await sync_to_async(search_cars)(qs, query)
+    paginator = CursorPaginator(qs, 3, ordering=CAR_LIST_ORDERING)
+    car_list = await paginator.aget_page(request.GET.get('cursor'))
+    await aannotate_versions(car_list)
+    return TemplateResponse(request, 'autoservisas/cars_list.html', {
+        'car_list': car_list,
+    })
+
+@aconditional(acar_changed)
+async def acar_detail(request, pk: int):
+    try:
+        car = await Car.objects.defer('note').aget(pk=pk)
+    except Car.DoesNotExist:
+        raise Http404
+    return TemplateResponse(request, 'autoservisas/car_detail.html', {'car': car})
+
+
+class FragmentVersionsMixin:
+    """Give listed objects the ``fragment_version`` their cached template rows are keyed on."""
+
+    def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        rows = list(context['object_list'])
+        annotate_versions(rows)
+        context['object_list'] = rows
+        context[self.get_context_object_name(rows)] = rows
+        return context
+
+
+class OrderListView(FragmentVersionsMixin, CursorPaginationMixin, generic.ListView):
     model = Order
     paginate_by = 3
     template_name = 'autoservisas/order_list.html'
 
     def get_queryset(self) -> QuerySet[Any]:
-        qs = super().get_queryset()
+        qs = super().get_queryset().for_list()
         query = self.request.GET.get('query')
         if query:
-            qs = qs.filter(
-                Q(date__istartswith=query) |
-                Q(car__customer__icontains=query) |
-                Q(car__plate_number__istartswith=query)
-            )
+            qs = search_orders(qs, query)
         return qs
 
 
+class AsyncOrderListView(OrderListView):
+    """``OrderListView`` reading its page with the async ORM, same template and context."""
+
+    async def get(self, request, *args, **kwargs):
+        queryset = await sync_to_async(self.get_queryset)()
+        paginator = self.get_cursor_paginator(queryset, self.get_paginate_by(queryset))
+        page = await paginator.aget_page(request.GET.get('cursor'))
+        rows = list(page)
+        await aannotate_versions(rows)
+        self.object_list = rows
+        return self.render_to_response({
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+            'object_list': rows,
+            self.get_context_object_name(queryset): rows,
+            'view': self,
+        })
+
+
+@conditional_view(order_changed)
 class OrderDetailView(generic.edit.FormMixin, generic.DetailView):
     model = Order
     template_name = 'autoservisas/order_details.html'
     form_class = OrderCommentForm
 
+    def get_queryset(self) -> QuerySet[Any]:
+        return super().get_queryset().select_related(
+            'customer', 'car__customer', 'car__car_model',
+        ).defer('car__note').prefetch_related(
+            Prefetch('order_entries', queryset=OrderEntry.objects.select_related('service')),
+            Prefetch('comments', queryset=OrderComment.objects.select_related('commenter__profile')),
+        )
+
+    def get_object(self, queryset=None):
+        # one fetch of the whole order graph per request
+        if getattr(self, 'object', None) is None:
+            self.object = super().get_object(queryset)
+        return self.object
+
     def get_initial(self) -> Dict[str, Any]:
         initial = super().get_initial()
         initial['order'] = self.get_object()
@@ -86,7 +239,7 @@ class OrderDetailView(generic.edit.FormMixin, generic.DetailView):
         return initial
 
     def post(self, request, *args, **kwargs):
-        self.object = self.get_object()
+        self.get_object()
         form = self.get_form()
         if form.is_valid():
             return self.form_valid(form)
@@ -104,15 +257,33 @@ class OrderDetailView(generic.edit.FormMixin, generic.DetailView):
         return reverse('order_details', kwargs={'pk':self.get_object().pk})
 
 
-class UserOrderListView(LoginRequiredMixin, generic.ListView):
+class OverdueOrderListView(UserPassesTestMixin, CursorPaginationMixin, generic.ListView):
+    model = Order
+    template_name = 'autoservisas/overdue_order_list.html'
+    context_object_name = 'orders'
+    paginate_by = 20
+    cursor_ordering = ('due_back', 'id')
+
+    def test_func(self) -> bool:
+        return self.request.user.is_staff
+
+    def get_queryset(self) -> QuerySet[Any]:
+        # what the rows show, the car notes stay behind as on the other list pages
+        return Order.objects.overdue().select_related('customer', 'car__car_model').only(
+            'id', 'date', 'status', 'due_back', 'customer', 'customer__username',
+            'car', 'car__plate_number', 'car__car_model', 'car__car_model__make', 'car__car_model__model',
+        )
+
+
+class UserOrderListView(LoginRequiredMixin, FragmentVersionsMixin, CursorPaginationMixin, generic.ListView):
     model = Order
     template_name = 'autoservisas/user_order_list.html'
     context_object_name = 'orders'
     paginate_by = 3
 
     def get_queryset(self) -> QuerySet[Any]:
-        qs = super().get_queryset()
-        qs = qs.filter(car__customer=self.request.user)
+        qs = super().get_queryset().for_list()
+        qs = qs.filter(customer=self.request.user)
         return qs
 
 
@@ -139,23 +310,17 @@ class OrderCreateView(LoginRequiredMixin, generic.CreateView):
     template_name = 'autoservisas/order_form.html'
     success_url = reverse_lazy('user_order_list')
 
-    def get_initial(self) -> Dict[str, Any]:
-        initial = super().get_initial()
-        initial['order_sum'] = 1
-        return initial
-
     def form_valid(self, form):
-        form.instance.order_sum = 1
         messages.success(self.request, _('Order Created!'))
         return super().form_valid(form)
 
 
-class UserCarListView(LoginRequiredMixin, generic.ListView):
+class UserCarListView(LoginRequiredMixin, FragmentVersionsMixin, generic.ListView):
     model = Car
     template_name = 'autoservisas/user_cars_list.html'
 
     def get_queryset(self) -> QuerySet[Any]:
-        qs = super().get_queryset()
+        qs = super().get_queryset().for_list()
         qs = qs.filter(customer=self.request.user)
         return qs
 
@@ -0,0 +1,49 @@
+import hashlib
+from time import time
+from django.conf import settings
+from django.core.cache import cache
+
+
+def pending_key(session_key: str) -> str:
+    # signed cookie session keys are far too long for some cache backends
+    return 'autoservisas:visits:' + hashlib.sha1(session_key.encode()).hexdigest()
+
+
+def pending_timeout() -> int:
+    # past the next due flush, after that a visit flushes anyway; an abandoned
+    # session key (signed cookie sessions change it on every save) then expires
+    return 2 * settings.VISIT_COUNTER_FLUSH_SECONDS
+
+
+def count_visit(request) -> int:
+    """Count a visit and return the visitor's total, this one included.
+
+    Visits are added up in the cache and written to the session only every
+    ``VISIT_COUNTER_FLUSH_EVERY`` visits or ``VISIT_COUNTER_FLUSH_SECONDS``,
+    so most page views do not save the session. Visits still pending are
+    lost if the cache drops them, the counter is a courtesy, not a ledger.
+    """
+    session = request.session
+    if not session.session_key:
+        # the first visit has to save the session to tell the visitor apart later
+        session['num_visits'] = 1
+        session['visits_flushed_at'] = time()
+        return 1
+    key = pending_key(session.session_key)
+    cache.add(key, 0, pending_timeout())
+    try:
+        pending = cache.incr(key)
+    except ValueError:
+        # evicted in between, count this visit alone
+        cache.set(key, 1, pending_timeout())
+        pending = 1
+    flushed = session.get('num_visits', 0)
+    if (
+        pending >= settings.VISIT_COUNTER_FLUSH_EVERY
+        or time() - session.get('visits_flushed_at', 0) >= settings.VISIT_COUNTER_FLUSH_SECONDS
+    ):
+        session['num_visits'] = flushed + pending
+        session['visits_flushed_at'] = time()
+        # saving may give the session a new key, this one would never be read again
+        cache.delete(key)
+    return flushed + pending
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from . import local_settings
 
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'autoservisas.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,14 +80,61 @@ WSGI_APPLICATION = 'car_service.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DJANGO_DB_ENGINE picks 'sqlite3' (default) or 'postgresql', see README
+
+DATABASE_ENGINE = os.environ.get('DJANGO_DB_ENGINE', 'sqlite3')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DJANGO_DB_NAME', 'car_service'),
+            'USER': os.environ.get('DJANGO_DB_USER', ''),
+            'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DJANGO_DB_HOST', ''),
+            'PORT': os.environ.get('DJANGO_DB_PORT', ''),
+            # persistent connections, checked before reuse
+            'CONN_MAX_AGE': int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            # PgBouncer in transaction pooling mode cannot keep server side cursors
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DJANGO_DB_PGBOUNCER') == '1',
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 60)),
+            'OPTIONS': {
+                # seconds a writer waits for the lock before "database is locked"
+                'timeout': 20,
+            },
+        }
+    }
+
+# Applied to every new SQLite connection by autoservisas.db.tune_sqlite
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
 }
 
 
+# Sessions
+# https://docs.djangoproject.com/en/4.2/topics/http/sessions/
+# Signed cookies keep sessions out of the database. Set DJANGO_SESSION_ENGINE to
+# 'django.contrib.sessions.backends.cache' (needs a cache shared by all workers)
+# or back to 'django.contrib.sessions.backends.db', see README for switching.
+
+SESSION_ENGINE = os.environ.get('DJANGO_SESSION_ENGINE', 'django.contrib.sessions.backends.signed_cookies')
+
+# The home page visit counter saves the session every this many visits or seconds
+VISIT_COUNTER_FLUSH_EVERY = 20
+VISIT_COUNTER_FLUSH_SECONDS = 300
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -125,12 +174,35 @@ STATIC_ROOT = BASE_DIR.joinpath(STATIC_URL)
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR.joinpath(MEDIA_URL)
 
+# Sized copies of uploaded car images and profile pictures, made in the background;
+# the make_renditions command makes them for older images and failed jobs.
+IMAGE_RENDITIONS = {
+    'thumbnail': (96, 96),
+    'list': (320, 320),
+    'detail': (1024, 1024),
+}
+IMAGE_RENDITION_FORMAT = 'WEBP'
+IMAGE_PROCESSING_WORKERS = 2  # 0 processes images inline
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = '/'
 
+# Per URL name query count and timing histograms, see autoservisas.instrumentation
+VIEW_INSTRUMENTATION = True
+VIEW_INSTRUMENTATION_SAMPLES = 1000
+DEFAULT_VIEW_QUERY_BUDGET = 20
+# GET and HEAD only, posting a form is held to the default budget
+VIEW_QUERY_BUDGETS = {
+    'index': 8,
+    'order_details': 8,
+}
+
+# Seconds the home page object counters stay cached, signals keep them current in between
+DASHBOARD_COUNTERS_TIMEOUT = 300
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 EMAIL_HOST = local_settings.EMAIL_HOST
 EMAIL_POST = 587
@@ -138,6 +210,24 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = local_settings.EMAIL_HOST_USER
 EMAIL_HOST_PASSWORD = local_settings.EMAIL_HOST_PASSWORD
 
+# Customer emails go through the OutboxEmail table, sent by the send_outbox worker.
+# A failed email is retried after OUTBOX_RETRY_SECONDS, doubling on every attempt.
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_SECONDS = 60
+# Emails claimed by a worker that died before sending them are retried after this long.
+OUTBOX_CLAIM_SECONDS = 600
+
+# Live order board, see autoservisas.events. PollingBroker when orders are saved in several processes.
+ORDER_EVENTS_BROKER = 'autoservisas.events.LocalBroker'
+ORDER_EVENTS_POLL_SECONDS = 2
+ORDER_EVENTS_KEEPALIVE_SECONDS = 15
+ORDER_EVENTS_STREAM_SECONDS = 300
+
+# Async index, car list, car detail and order list, for deployments on an ASGI server.
+# Under WSGI each async view costs an event loop per request, keep them off there.
+ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS') == '1'
+
 TINYMCE_DEFAULT_CONFIG = {
     'height': 360,
     'width': 1120,
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_profile', '0002_alter_profile_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='picture_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def normalize_text(value):
+    return ' '.join((value or '').split()).upper()
+
+
+def fill_search_names(apps, schema_editor, batch_size=1000):
+    """Copy every user's names into its profile, creating the profiles still missing."""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Profile = apps.get_model('user_profile', 'Profile')
+    last_id = 0
+    while True:
+        users = list(User.objects.filter(pk__gt=last_id).order_by('pk').only('pk', *NAME_FIELDS)[:batch_size])
+        if not users:
+            return
+        last_id = users[-1].pk
+        names = {
+            user.pk: {f'normalized_{field}': normalize_text(getattr(user, field)) for field in NAME_FIELDS}
+            for user in users
+        }
+        profiles = list(Profile.objects.filter(user_id__in=names))
+        for profile in profiles:
+            for field, value in names.pop(profile.user_id).items():
+                setattr(profile, field, value)
+        Profile.objects.bulk_update(profiles, [f'normalized_{field}' for field in NAME_FIELDS])
+        Profile.objects.bulk_create(
+            [Profile(user_id=user_id, **fields) for user_id, fields in names.items()], ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('user_profile', '0003_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='normalized_first_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=150),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='normalized_last_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=150),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='normalized_username',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=150),
+        ),
+        migrations.RunPython(fill_search_names, migrations.RunPython.noop),
+    ]
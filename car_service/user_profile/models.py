@@ -2,10 +2,14 @@ from django.contrib.auth import get_user_model
 from django.db import models
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
-from PIL import Image
+from autoservisas.images import RenditionsMixin
+from autoservisas.models import normalize_text
 
+# user name fields copied upper-cased for the order search
+NAME_FIELDS = ("username", "first_name", "last_name")
 
-class Profile(models.Model):
+
+class Profile(RenditionsMixin, models.Model):
     user = models.OneToOneField(
         get_user_model(),
         verbose_name=_("user"), 
@@ -14,6 +18,13 @@ class Profile(models.Model):
         null=True, blank=True,
         )
     picture = models.ImageField(_("picture"), upload_to='user_profile/pictures')
+    picture_hash = models.CharField(max_length=64, editable=False, blank=True, default="")
+    # upper-cased in Python, SQLite's UPPER() leaves non-ASCII letters like Š alone
+    normalized_username = models.CharField(max_length=150, editable=False, db_index=True, default="")
+    normalized_first_name = models.CharField(max_length=150, editable=False, db_index=True, default="")
+    normalized_last_name = models.CharField(max_length=150, editable=False, db_index=True, default="")
+
+    rendition_fields = {"picture": "picture_hash"}
 
     class Meta:
         verbose_name = _("profile")
@@ -22,14 +33,16 @@ class Profile(models.Model):
     def __str__(self):
         return str(self.user)
 
-    def get_absolute_url(self):
-        return reverse("profile_detail", kwargs={"pk": self.pk})
+    @staticmethod
+    def normalized_names(user) -> dict:
+        return {f"normalized_{field}": normalize_text(getattr(user, field)) for field in NAME_FIELDS}
 
-    def save(self, *args, **kwargs) -> None:
+    def save(self, *args, **kwargs):
+        # a profile loaded before its user was renamed must not write the old names back
+        if self.user is not None:
+            for field, value in self.normalized_names(self.user).items():
+                setattr(self, field, value)
         super().save(*args, **kwargs)
-        if self.picture:
-            pic = Image.open(self.picture.path)
-            if pic.width > 300 or pic.height > 300:
-                new_size = (300, 300)
-                pic.thumbnail(new_size)
-                pic.save(self.picture.path)
\ No newline at end of file
+
+    def get_absolute_url(self):
+        return reverse("profile_detail", kwargs={"pk": self.pk})
\ No newline at end of file
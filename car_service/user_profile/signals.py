@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from . models import NAME_FIELDS, Profile
+
+
+@receiver(post_save, sender=get_user_model())
+def create_profile(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # bulk_create skips signals, create_user_profiles covers those users
+    if raw:
+        return
+    names = Profile.normalized_names(instance)
+    if created:
+        Profile.objects.get_or_create(user=instance, defaults=names)
+    elif update_fields is None or set(update_fields) & set(NAME_FIELDS):
+        # an update, Profile.save() would look at the picture too; logins save last_login only
+        if not Profile.objects.filter(user=instance).update(**names):
+            Profile.objects.get_or_create(user=instance, defaults=names)
@@ -1,3 +1,38 @@
-from django.test import TestCase
+import tempfile
+from io import BytesIO, StringIO
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from . models import Profile
 
-# Create your tests here.
+
+class ProfileTestCase(TestCase):
+    def test_new_user_gets_profile(self):
+        user = get_user_model().objects.create_user(username="jonas", password="secret")
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+
+    def test_create_user_profiles_fills_gaps(self):
+        User = get_user_model()
+        User.objects.bulk_create(User(username=f"imported{number}") for number in range(5))
+        self.assertEqual(Profile.objects.count(), 0)
+        call_command("create_user_profiles", batch_size=2, stdout=StringIO())
+        self.assertEqual(Profile.objects.count(), 5)
+        call_command("create_user_profiles", stdout=StringIO())
+        self.assertEqual(Profile.objects.count(), 5)
+        self.assertEqual(Profile.objects.get(user__username="imported3").normalized_username, "IMPORTED3")
+
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp(), IMAGE_PROCESSING_WORKERS=0)
+    def test_profile_update_keeps_new_search_names(self):
+        user = get_user_model().objects.create_user(username="jonas", first_name="Jonas", password="secret")
+        self.client.force_login(user)
+        output = BytesIO()
+        Image.new("RGB", (10, 10), "red").save(output, "PNG")
+        self.client.post(reverse("profile_update"), {
+            "first_name": "Šarūnas", "last_name": "", "username": "jonas", "email": "jonas@example.com",
+            "picture": SimpleUploadedFile("me.png", output.getvalue(), content_type="image/png"),
+        })
+        self.assertEqual(Profile.objects.get(user=user).normalized_first_name, "ŠARŪNAS")